@@ -0,0 +1,126 @@
+"""
+Recorded provider payloads for offline benchmarks. Record them (needs network access) with
+
+    $ python -m benchmarks.fixtures
+
+Cities without a recording are replaced with a deterministic synthetic payload of the same shape.
+"""
+import datetime
+import functools
+import json
+import os
+import random
+import zlib
+
+from default_data import CITY_MAP, ELEMENTS_MAP
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+EXTENSIONS = {"yrno": "xml", "emhi": "json"}
+
+
+def get_path(city: str, provider: str) -> str:
+    return os.path.join(FIXTURES_DIR, provider, "{}.{}".format(city.lower(), EXTENSIONS[provider]))
+
+
+def load(city: str, provider: str):
+    """
+    Returns the recorded (or, if missing, synthetic) payload of city.
+    :param city: str, key of CITY_MAP
+    :param provider: str in ["emhi", "yrno"]
+    :return: bytes (yrno XML) or str (emhi JSONP)
+    """
+    path = get_path(city, provider)
+    if not os.path.exists(path):
+        return synthetic_yrno(city) if provider == "yrno" else synthetic_emhi(city)
+    with open(path, "rb") as fixture:
+        content = fixture.read()
+    return content if provider == "yrno" else content.decode("utf-8")
+
+
+def is_recorded(city: str, provider: str) -> bool:
+    return os.path.exists(get_path(city, provider))
+
+
+def record(cities: list) -> None:
+    """
+    Downloads the current payloads of cities from the providers into FIXTURES_DIR.
+    :param cities: list of str
+    :return: None
+    """
+    from forecast_data import City
+    for city_name in cities:
+        city = City.__new__(City)
+        city.name = city_name
+        city.validators = {}
+        for provider in EXTENSIONS:
+            content = city._fetch(provider)
+            path = get_path(city_name, provider)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as fixture:
+                fixture.write(content if provider == "yrno" else content.encode("utf-8"))
+        print("Recorded", city_name)
+
+
+def _get_random(city: str, provider: str) -> random.Random:
+    return random.Random(zlib.crc32("{}/{}".format(city, provider).encode("utf-8")))
+
+
+def _get_hours(hours: int, start: datetime.datetime = datetime.datetime(2018, 3, 25)) -> list:
+    return [(start + datetime.timedelta(hours=hour), start + datetime.timedelta(hours=hour + 1))
+            for hour in range(hours)]
+
+
+@functools.lru_cache(maxsize=None)
+def synthetic_yrno(city: str, hours: int = 48) -> bytes:
+    """
+    Returns a yr.no forecast_hour_by_hour.xml-like payload.
+    :param city: str
+    :param hours: int
+    :return: bytes
+    """
+    rand = _get_random(city, "yrno")
+    symbols = ["01d", "02n", "03d", "04", "09", "46", "13"]
+    temperature = rand.randint(-10, 20)
+    times = []
+    for start, end in _get_hours(hours):
+        temperature += rand.choice([-1, 0, 0, 1])
+        times.append(
+            '<time from="{}" to="{}"><symbol number="3" numberEx="3" name="Partly cloudy" var="{}" />'
+            '<precipitation value="{}" /><windDirection deg="{:.1f}" code="W" name="West" />'
+            '<windSpeed mps="{:.1f}" name="Breeze" /><temperature unit="celsius" value="{}" />'
+            '<pressure unit="hPa" value="{:.1f}" /></time>'.format(
+                start.isoformat(), end.isoformat(), rand.choice(symbols), rand.choice(["0", "0", "0.2", "1.4"]),
+                rand.uniform(0, 360), rand.uniform(0, 12), temperature, rand.uniform(980, 1030)))
+    return ('<?xml version="1.0" encoding="utf-8"?><weatherdata><location><name>{0}</name></location>'
+            '<sun rise="2018-03-25T07:07:35" set="2018-03-25T19:47:12" /><forecast><tabular>{1}</tabular>'
+            '</forecast></weatherdata>'.format(city, "".join(times))).encode("utf-8")
+
+
+@functools.lru_cache(maxsize=None)
+def synthetic_emhi(city: str, hours: int = 48) -> str:
+    """
+    Returns an ilmateenistus.ee meteogram.php-like JSONP payload; about 2/3 of the phenomens are empty.
+    :param city: str
+    :param hours: int
+    :return: str
+    """
+    rand = _get_random(city, "emhi")
+    phenomens = list(ELEMENTS_MAP["emhi_symbols"])
+    temperature = rand.randint(-10, 20)
+    times = []
+    for i, (start, end) in enumerate(_get_hours(hours)):
+        temperature += rand.choice([-1, 0, 0, 1])
+        times.append({
+            "@attributes": {"from": start.isoformat(), "to": end.isoformat()},
+            "phenomen": {"@attributes": {"className": rand.choice(phenomens) if i % 3 == 0 else ""}},
+            "precipitation": {"@attributes": {"value": rand.choice(["0", "0", "0.3", "1.1"])}},
+            "windDirection": {"@attributes": {"deg": str(rand.randint(0, 359))}},
+            "windSpeed": {"@attributes": {"mps": str(rand.randint(0, 12))}},
+            "temperature": {"@attributes": {"value": str(temperature)}},
+            "pressure": {"@attributes": {"value": str(rand.randint(980, 1030))}},
+        })
+    return "callback({});".format(json.dumps({"forecast": {"tabular": {"time": times}}}))
+
+
+if __name__ == "__main__":
+    record(list(CITY_MAP))
@@ -0,0 +1,264 @@
+"""
+Load test of one `bokeh serve forecast_visualize.py` process: a stand-in upstream serves recorded provider payloads
+(see benchmarks.fixtures) with configurable latency, and N concurrent client sessions switch cities (city_picker)
+with Zipf-like city popularity. Reports switch latency percentiles, throughput and server CPU and memory for each
+amount of sessions, i.e. to find where throughput falls off.
+
+    $ python -m benchmarks.loadtest --sessions 1 10 50 100 --duration 60 --latency 0.3
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import unquote, urlparse
+
+import numpy as np
+
+from benchmarks import fixtures
+from default_data import CITY_MAP
+
+try:
+    import psutil
+except ImportError:  # Server CPU and memory are then read from /proc (Linux)
+    psutil = None
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "forecast_visualize.py")
+PERCENTILES = (50, 90, 99)
+SWITCH_TIMEOUT = 60  # Seconds; a switch which takes longer is counted as failed
+SERVER_START_TIMEOUT = 60  # Seconds
+
+
+class UpstreamHandler(BaseHTTPRequestHandler):
+    """
+    Serves GET /yrno/<yrno code> and GET /emhi/<emhi code> after .server.latency (+- .server.jitter) seconds,
+    with ETags (If-None-Match is answered with 304, like the real providers).
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        provider, _, code = unquote(urlparse(self.path).path).lstrip("/").partition("/")
+        city = self.server.cities.get((provider, code))
+        if city is None:
+            self.send_error(404)
+            return
+        time.sleep(max(0.0, random.gauss(self.server.latency, self.server.jitter)))
+        payload = fixtures.load(city, provider)
+        body = payload if provider == "yrno" else payload.encode("utf-8")  # yrno XML is already bytes
+        etag = '"{}"'.format(hashlib.sha1(body).hexdigest()[:16])
+        with self.server.lock:
+            self.server.requests += 1
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Upstream(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int, latency: float, jitter: float):
+        super().__init__(("127.0.0.1", port), UpstreamHandler)
+        self.latency = latency  # float, seconds
+        self.jitter = jitter  # float, seconds (standard deviation)
+        self.requests = 0  # int
+        self.lock = threading.Lock()
+        self.cities = {}  # (provider, code) -> city name
+        for city, codes in CITY_MAP.items():
+            for provider in fixtures.EXTENSIONS:
+                self.cities[(provider, codes[provider])] = city
+
+    def get_env(self) -> dict:
+        """
+        :return: dict; environment variables, which point forecast_data to this upstream
+        """
+        base = "http://127.0.0.1:{}".format(self.server_address[1])
+        return {"FORECAST_YRNO_URL": base + "/yrno/{}", "FORECAST_EMHI_URL": base + "/emhi/{}"}
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int, env: dict, num_procs: int) -> subprocess.Popen:
+    """
+    Starts `bokeh serve forecast_visualize.py` and waits until it accepts connections.
+    """
+    command = [sys.executable, "-m", "bokeh", "serve", APP_PATH, "--port", str(port),
+               "--allow-websocket-origin", "127.0.0.1:{}".format(port), "--num-procs", str(num_procs)]
+    process = subprocess.Popen(command, cwd=os.path.dirname(APP_PATH), env=dict(os.environ, **env),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("bokeh serve exited with {}".format(process.returncode))
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("bokeh serve did not start in {} seconds".format(SERVER_START_TIMEOUT))
+
+
+def get_server_usage(pid: int) -> tuple:
+    """
+    Returns the CPU time and memory of the server process (and of its worker processes, with psutil).
+    :param pid: int
+    :return: (float, int), i.e. (CPU seconds, RSS bytes)
+    """
+    if psutil is not None:
+        processes = [psutil.Process(pid)]
+        processes += processes[0].children(recursive=True)
+        cpu_seconds, rss = 0.0, 0
+        for process in processes:
+            try:
+                times = process.cpu_times()
+                cpu_seconds += times.user + times.system
+                rss += process.memory_info().rss
+            except psutil.NoSuchProcess:
+                pass
+        return cpu_seconds, rss
+    with open("/proc/{}/stat".format(pid)) as stat_file:
+        fields = stat_file.read().rsplit(")", 1)[1].split()
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")  # utime + stime
+    with open("/proc/{}/status".format(pid)) as status_file:
+        rss = next(int(line.split()[1]) * 1024 for line in status_file if line.startswith("VmRSS:"))
+    return cpu_seconds, rss
+
+
+def get_popularity(cities: list, exponent: float) -> list:
+    """
+    Returns Zipf-like weights of cities (in order of popularity, i.e. CITY_MAP order is by population).
+    :param cities: list of str
+    :param exponent: float, 0 = uniform
+    :return: list of float
+    """
+    return [1 / (rank + 1) ** exponent for rank in range(len(cities))]
+
+
+def run_session(url: str, cities: list, weights: list, think: float, stop: threading.Event, results: dict) -> None:
+    """
+    Opens one client session and switches cities until stop is set; records switch latencies into results.
+    A switch is complete when the plot title of the session shows the new city (i.e. its data has arrived).
+    """
+    from bokeh.client import pull_session
+
+    rng = random.Random()
+    try:
+        with pull_session(url=url) as session:
+            city_picker = session.document.get_model_by_name("city_picker")
+            figure = session.document.get_model_by_name("forecast")
+            while not stop.is_set():
+                city = rng.choices(cities, weights)[0]
+                if city == city_picker.value:
+                    continue
+                t0 = time.perf_counter()
+                city_picker.value = city  # Sent to the server as a document patch
+                expected_title = "Ilmaennustus - {}".format(city.title())  # City names are title-cased
+                while figure.title.text != expected_title:
+                    session.request_server_info()  # Round trip; the server's patches are applied meanwhile
+                    if time.perf_counter() - t0 > SWITCH_TIMEOUT:
+                        raise TimeoutError("Switching to {} took over {} s".format(city, SWITCH_TIMEOUT))
+                with results["lock"]:
+                    results["latencies"].append(time.perf_counter() - t0)
+                stop.wait(rng.expovariate(1 / think) if think else 0)
+    except Exception as error:
+        with results["lock"]:
+            results["errors"].append(repr(error))
+
+
+def run_step(url: str, pid: int, sessions: int, duration: float, cities: list, weights: list,
+             think: float) -> dict:
+    """
+    Runs sessions concurrent sessions for duration seconds.
+    :return: dict; latency percentiles (ms), "switches_per_s", "cpu_percent", "rss_mib", "rss_per_session_mib",
+             "errors"
+    """
+    results = {"latencies": [], "errors": [], "lock": threading.Lock()}
+    stop = threading.Event()
+    cpu_before, rss_before = get_server_usage(pid)
+    started = time.perf_counter()
+    threads = [threading.Thread(target=run_session, args=(url, cities, weights, think, stop, results), daemon=True)
+               for _ in range(sessions)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    cpu_after, rss_after = get_server_usage(pid)  # Measured while the sessions are still open
+    stop.set()
+    for thread in threads:
+        thread.join(SWITCH_TIMEOUT)
+    elapsed = time.perf_counter() - started
+    latencies = results["latencies"] or [float("nan")]
+    step = {"p{}_ms".format(p): float(np.percentile(latencies, p)) * 1000 for p in PERCENTILES}
+    step["max_ms"] = float(np.max(latencies)) * 1000
+    step["switches_per_s"] = len(results["latencies"]) / elapsed
+    step["cpu_percent"] = (cpu_after - cpu_before) / duration * 100
+    step["rss_mib"] = rss_after / 2 ** 20
+    step["rss_per_session_mib"] = (rss_after - rss_before) / 2 ** 20 / sessions
+    step["errors"] = len(results["errors"])
+    if results["errors"]:
+        print("{} sessions: {}".format(sessions, results["errors"][0]), file=sys.stderr)
+    return step
+
+
+def print_results(results: dict) -> None:
+    columns = ["p{}_ms".format(p) for p in PERCENTILES] + ["max_ms", "switches_per_s", "cpu_percent", "rss_mib",
+                                                           "rss_per_session_mib", "errors"]
+    print("{:<10}".format("sessions") + "".join("{:>21}".format(column) for column in columns))
+    for sessions, step in results.items():
+        print("{:<10}".format(sessions) + "".join("{:>21.1f}".format(step[column]) for column in columns))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 10, 50], help="concurrent sessions per step")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per step")
+    parser.add_argument("--latency", type=float, default=0.3, help="mean upstream latency, seconds")
+    parser.add_argument("--jitter", type=float, default=0.1, help="standard deviation of upstream latency")
+    parser.add_argument("--think", type=float, default=2.0, help="mean pause between switches of a session, seconds")
+    parser.add_argument("--zipf", type=float, default=1.1, help="exponent of city popularity (0 = uniform)")
+    parser.add_argument("--cities", type=int, default=len(CITY_MAP), help="amount of (most popular) cities")
+    parser.add_argument("--num-procs", type=int, default=1, help="passed to bokeh serve")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    upstream = Upstream(get_free_port(), args.latency, args.jitter)
+    threading.Thread(target=upstream.serve_forever, name="upstream", daemon=True).start()
+    server_port = get_free_port()
+    server = start_server(server_port, upstream.get_env(), args.num_procs)
+    try:
+        app_url = "http://127.0.0.1:{}/forecast_visualize".format(server_port)
+        city_names = list(CITY_MAP)[:args.cities]
+        city_weights = get_popularity(city_names, args.zipf)
+        loadtest_results = {}
+        for session_count in args.sessions:
+            loadtest_results[session_count] = run_step(app_url, server.pid, session_count, args.duration,
+                                                       city_names, city_weights, args.think)
+        print_results(loadtest_results)
+        print("Upstream requests: {}".format(upstream.requests))
+        if args.save:
+            with open(args.save, "w") as results_file:
+                json.dump(loadtest_results, results_file, indent=2)
+    finally:
+        server.terminate()
+        server.wait()
@@ -0,0 +1,103 @@
+"""
+Measures payload bytes and server-side serialization time of a city switch, i.e. of the PATCH-DOC message
+Bokeh sends after update() changes the data source.
+
+    $ python -m benchmarks.payload --repeat 200
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+from bokeh.document import Document
+from bokeh.models import ColumnDataSource
+from bokeh.protocol import Protocol
+
+import forecast_payload
+
+
+def make_forecast(seed: int, hours: int = 48) -> pd.DataFrame:
+    """
+    Returns a synthetic City.union-like dataframe; forecasts with different seeds share the same time axis.
+    :param seed: int
+    :param hours: int
+    :return: pd.DataFrame
+    """
+    random = np.random.RandomState(seed)
+    start = pd.date_range("2018-03-25", periods=hours, freq="h")
+    symbols = np.array(["01d", "02n", "03d", "04", "46", None], dtype=object)
+    return pd.DataFrame({
+        "start": start,
+        "temperature_emhi": np.round(np.cumsum(random.normal(0, 1, hours))),
+        "temperature_yrno": np.round(np.cumsum(random.normal(0, 1, hours))),
+        "precipitation_emhi": np.round(random.exponential(0.3, hours) * (random.rand(hours) > 0.6), 1),
+        "precipitation_yrno": np.round(random.exponential(0.3, hours) * (random.rand(hours) > 0.6), 1),
+        "symbol_emhi": symbols[random.randint(0, len(symbols), hours)],
+        "symbol_yrno": symbols[random.randint(0, len(symbols) - 1, hours)],
+    })
+
+
+def get_list_source_data(forecast: pd.DataFrame) -> dict:
+    """
+    Returns the data source as Python lists with datetime objects, i.e. the payload before binary arrays.
+    :param forecast: pd.DataFrame
+    :return: dict; column name -> list
+    """
+    data = forecast_payload.get_source_data(forecast)
+    list_data = {column: values.tolist() for column, values in data.items()}
+    list_data["start"] = [ts.to_pydatetime() for ts in forecast["start"]]
+    return list_data
+
+
+def measure_switch(doc: Document, source: ColumnDataSource, new_data: dict, patch: bool) -> tuple:
+    """
+    Applies new_data to source and serializes the resulting PATCH-DOC message.
+    :return: (int, float); payload bytes (JSON + binary buffers), serialization time in seconds
+    """
+    events = []
+    doc.on_change(events.append)
+    if patch:
+        changed_data = forecast_payload.get_changed_columns(source.data, new_data)
+        if len(changed_data) == len(new_data):
+            source.data = new_data
+        elif changed_data:
+            source.data.update(changed_data)
+    else:
+        source.data = new_data
+    doc.remove_on_change(events.append)
+
+    t0 = time.perf_counter()
+    message = Protocol().create("PATCH-DOC", events)
+    payload_bytes = len(message.content_json.encode("utf-8"))
+    payload_bytes += sum(len(memoryview(getattr(buffer, "data", buffer))) for buffer in message.buffers)
+    return payload_bytes, time.perf_counter() - t0
+
+
+def run(repeat: int, hours: int) -> None:
+    forecasts = [make_forecast(seed, hours) for seed in range(2)]
+    scenarios = [
+        ("lists, full replace", get_list_source_data, False),
+        ("arrays, full replace", forecast_payload.get_source_data, False),
+        ("arrays, patch", forecast_payload.get_source_data, True),
+    ]
+    print("{:<22} {:>12} {:>14}".format("scenario", "bytes/switch", "ms/switch (p50)"))
+    for name, get_data, patch in scenarios:
+        payloads = [get_data(forecast) for forecast in forecasts]
+        source = ColumnDataSource(data=payloads[0])
+        doc = Document()
+        doc.add_root(source)
+        sizes, times = [], []
+        for i in range(repeat):
+            size, seconds = measure_switch(doc, source, payloads[(i + 1) % 2], patch)
+            sizes.append(size)
+            times.append(seconds)
+        print("{:<22} {:>12.0f} {:>14.3f}".format(name, statistics.mean(sizes), statistics.median(times) * 1000))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=100, help="amount of city switches per scenario")
+    parser.add_argument("--hours", type=int, default=48, help="amount of forecast hours")
+    args = parser.parse_args()
+    run(args.repeat, args.hours)
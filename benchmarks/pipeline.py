@@ -0,0 +1,159 @@
+"""
+Offline benchmark of the forecast pipeline: replays recorded provider payloads (see benchmarks.fixtures) for all
+CITY_MAP cities and reports latency percentiles, peak and retained memory per stage.
+
+    $ python -m benchmarks.pipeline --save before.json
+    $ python -m benchmarks.pipeline --compare before.json --threshold 0.1
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import forecast_payload
+import midnights
+from benchmarks import fixtures
+from default_data import CITY_MAP
+from forecast_data import City, FORECAST_COLUMNS
+
+PERCENTILES = (50, 90, 99)
+
+
+class FixtureCity(City):
+    """
+    City whose fetches are replaced with recorded payloads (i.e. a fetch stub).
+    """
+    def _request(self, forecast_provider: str, previous: City = None, deadline: float = None) -> tuple:
+        return fixtures.load(self.name, forecast_provider), None
+
+
+def get_stages(city_name: str) -> list:
+    """
+    Returns the benchmarked stages of one city as (stage, callable) pairs; each stage uses the results of the
+    previous ones, so they must be called in order.
+    :param city_name: str
+    :return: list of (str, callable)
+    """
+    state = {}
+    city = City.__new__(City)
+    city.name = city_name
+
+    def fetch():
+        state["yrno_raw"] = fixtures.load(city_name, "yrno")
+        state["emhi_raw"] = fixtures.load(city_name, "emhi")
+
+    def parse():
+        state["yrno_columns"], sun = City._read_yrno_columns(state["yrno_raw"])
+        city.sunrise, city.sunset = City.str_to_dt(sun["rise"]), City.str_to_dt(sun["set"])
+        emhi_json = json.loads(state["emhi_raw"].replace("callback(", "").replace(");", ""))
+        state["emhi_columns"] = City._read_emhi_columns(emhi_json["forecast"]["tabular"]["time"])
+
+    def dtypes():
+        city.yrno = City.convert_df_dtypes(pd.DataFrame(state["yrno_columns"], columns=FORECAST_COLUMNS))
+        city.emhi = City.convert_df_dtypes(pd.DataFrame(state["emhi_columns"], columns=FORECAST_COLUMNS))
+        city.emhi["symbol"] = city._convert_emhi_symbols(city.emhi["symbol"], city.emhi["start"])
+
+    def merge():
+        city.union = city.get_uniondf()
+
+    def jsonize():
+        for column in ("start", "temperature_emhi", "precipitation_yrno", "symbol_emhi"):
+            forecast_payload.jsonize_values(city.union[column])
+
+    def split():
+        forecast_payload.split_temperatures(city.union["temperature_yrno"].values)
+
+    def midnight_labels():
+        midnights.get(city.union["start"])
+
+    def payload():
+        city.fetched_at = time.time()
+        forecast_payload.build(city)
+
+    return [("fetch", fetch), ("parse", parse), ("dtypes", dtypes), ("merge", merge),
+            ("jsonize_values", jsonize), ("split_temperatures", split), ("midnights", midnight_labels),
+            ("payload", payload), ("city", lambda: FixtureCity(city_name).load())]
+
+
+def run(cities: list, repeat: int) -> dict:
+    """
+    :return: dict; stage -> {"p50_ms": ..., "p90_ms": ..., "p99_ms": ..., "peak_kib": ..., "retained_kib": ...}
+    """
+    timings = {}
+    memory = {}
+    for _ in range(repeat):
+        for city_name in cities:
+            for stage, function in get_stages(city_name):
+                t0 = time.perf_counter()
+                function()
+                timings.setdefault(stage, []).append(time.perf_counter() - t0)
+    for city_name in cities:  # Separate pass, as tracing slows down the measured code.
+        for stage, function in get_stages(city_name):
+            tracemalloc.start()
+            function()
+            retained, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            memory.setdefault(stage, []).append((peak, retained))
+    results = {}
+    for stage, seconds in timings.items():
+        result = {"p{}_ms".format(p): float(np.percentile(seconds, p)) * 1000 for p in PERCENTILES}
+        result["peak_kib"] = max(peak for peak, _ in memory[stage]) / 1024
+        result["retained_kib"] = float(np.mean([retained for _, retained in memory[stage]])) / 1024
+        results[stage] = result
+    return results
+
+
+def print_results(results: dict, baseline: dict = None) -> None:
+    columns = ["p{}_ms".format(p) for p in PERCENTILES] + ["peak_kib", "retained_kib"]
+    print("{:<20}".format("stage") + "".join("{:>17}".format(column) for column in columns))
+    for stage, result in results.items():
+        cells = []
+        for column in columns:
+            cell = "{:.3f}".format(result[column])
+            if baseline and stage in baseline:
+                cell += " ({:+.0%})".format(result[column] / baseline[stage][column] - 1
+                                            if baseline[stage][column] else 0)
+            cells.append(cell)
+        print("{:<20}".format(stage) + "".join("{:>17}".format(cell) for cell in cells))
+
+
+def get_regressions(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Returns the stages whose median latency is more than threshold (relative) slower than in baseline.
+    :return: list of str
+    """
+    return [stage for stage, result in results.items()
+            if stage in baseline and result["p50_ms"] > baseline[stage]["p50_ms"] * (1 + threshold)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="amount of rounds over all cities")
+    parser.add_argument("--cities", nargs="*", default=list(CITY_MAP), help="default: all CITY_MAP cities")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare the results to this JSON file (see --save)")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative p50 slowdown which counts as a regression (with --compare)")
+    args = parser.parse_args()
+
+    synthetic = [city for city in args.cities if not all(fixtures.is_recorded(city, p) for p in fixtures.EXTENSIONS)]
+    if synthetic:
+        print("No recording for {} of {} cities; using synthetic payloads".format(len(synthetic), len(args.cities)))
+    results = run(args.cities, args.repeat)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+    print_results(results, baseline)
+    if args.save:
+        with open(args.save, "w") as results_file:
+            json.dump(results, results_file, indent=2)
+    if baseline:
+        regressions = get_regressions(results, baseline, args.threshold)
+        if regressions:
+            print("Regressions: {}".format(", ".join(regressions)))
+            sys.exit(1)
@@ -0,0 +1,169 @@
+"""
+Measures the cold start of a server process (interpreter start + importing the app's modules) and the latency of
+creating a new Bokeh session of forecast_visualize.py, with an empty and with a warm forecast cache. Provider
+fetches are replaced with recorded payloads (see benchmarks.fixtures) delayed by --latency.
+
+    $ python -m benchmarks.startup --repeat 10 --latency 0.5
+
+The app is written for Bokeh 0.12 (i.e. figure(responsive=True) was removed in 0.12.10), which needs Python <= 3.9
+and tornado 4.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+from benchmarks import fixtures
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "forecast_visualize.py")
+APP_MODULES = ["bokeh.plotting", "forecast_cache", "forecast_payload", "forecast_plot", "metrics", "prefetch"]
+PERCENTILES = (50, 90, 99)
+DATA_TIMEOUT = 60  # Seconds to wait for the forecast of a cold session
+
+IMPORT_CODE = """
+import json, time
+t0 = time.perf_counter()
+{imports}
+print(json.dumps({{"import_s": time.perf_counter() - t0}}))
+"""
+
+
+def get_percentiles(seconds: list) -> dict:
+    return {"p{}_ms".format(p): float(np.percentile(seconds, p)) * 1000 for p in PERCENTILES}
+
+
+def measure_cold_start(repeat: int) -> dict:
+    """
+    Starts a new interpreter repeat times and imports APP_MODULES in it.
+    :return: dict; "process" (interpreter start + imports) and "imports" -> percentiles
+    """
+    code = IMPORT_CODE.format(imports="\n".join("import {}".format(module) for module in APP_MODULES))
+    cwd = os.path.dirname(APP_PATH)
+    process_seconds, import_seconds = [], []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        output = subprocess.check_output([sys.executable, "-c", code], cwd=cwd)
+        process_seconds.append(time.perf_counter() - t0)
+        import_seconds.append(json.loads(output.decode("utf-8").splitlines()[-1])["import_s"])
+    return {"process": get_percentiles(process_seconds), "imports": get_percentiles(import_seconds)}
+
+
+def check_bokeh() -> str:
+    """
+    Builds the figure of the app, so that an unsupported Bokeh version fails here and not in every session.
+    :return: str, Bokeh version
+    """
+    import bokeh
+    import forecast_plot
+    try:
+        forecast_plot.make_figure()
+    except AttributeError as error:
+        raise SystemExit("forecast_visualize.py does not run on Bokeh {} (see the module docstring): {}".format(
+            bokeh.__version__, error))
+    return bokeh.__version__
+
+
+def stub_providers(latency: float) -> None:
+    """
+    Replaces provider requests of this process with recorded payloads, which arrive after latency seconds.
+    """
+    import forecast_data
+
+    def request(self, forecast_provider: str, previous=None, deadline: float = None) -> tuple:
+        time.sleep(latency)
+        return fixtures.load(self.name, forecast_provider), None
+    forecast_data.City._request = request
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int) -> None:
+    """
+    Serves forecast_visualize.py in a background thread of this process (so that the cache can be reset).
+    """
+    from bokeh.application import Application
+    from bokeh.application.handlers import ScriptHandler
+    from bokeh.server.server import Server
+    started = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        server = Server({"/forecast_visualize": Application(ScriptHandler(filename=APP_PATH))}, port=port,
+                        allow_websocket_origin=["127.0.0.1:{}".format(port)])
+        server.start()
+        started.set()
+        server.io_loop.start()
+    threading.Thread(target=run, name="benchmark-server", daemon=True).start()
+    started.wait()
+
+
+def measure_sessions(repeat: int, port: int) -> dict:
+    """
+    Opens repeat sessions with an empty forecast cache (cold) and repeat sessions with a warm one.
+    :return: dict; "session_cold", "data_cold" (until the forecast is in the cache), "session_warm" -> percentiles
+    """
+    from bokeh.client import pull_session
+    import forecast_cache
+    import forecast_payload
+
+    url = "http://127.0.0.1:{}/forecast_visualize".format(port)
+    session_cold, data_cold, session_warm = [], [], []
+    for _ in range(repeat):
+        forecast_cache.CACHE = None  # Cold cache; setup creates a new one
+        with forecast_payload._payloads_lock:  # A callback of the previous session may still be running
+            forecast_payload._payloads.clear()
+        t0 = time.perf_counter()
+        session = pull_session(url=url)  # Not a context manager in Bokeh 0.12
+        try:
+            session_cold.append(time.perf_counter() - t0)
+            while "Tartu" not in forecast_cache.get_cache():  # Default city of forecast_visualize.py
+                if time.perf_counter() - t0 > DATA_TIMEOUT:
+                    raise RuntimeError("The session did not fetch a forecast; see the server log")
+                time.sleep(0.005)
+            data_cold.append(time.perf_counter() - t0)
+        finally:
+            session.close()
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        session = pull_session(url=url)
+        session_warm.append(time.perf_counter() - t0)
+        session.close()
+    return {"session_cold": get_percentiles(session_cold), "data_cold": get_percentiles(data_cold),
+            "session_warm": get_percentiles(session_warm)}
+
+
+def print_results(results: dict) -> None:
+    columns = ["p{}_ms".format(p) for p in PERCENTILES]
+    print("{:<20}".format("measurement") + "".join("{:>12}".format(column) for column in columns))
+    for name, result in results.items():
+        print("{:<20}".format(name) + "".join("{:>12.1f}".format(result[column]) for column in columns))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per (stubbed) provider request")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    print("Bokeh {}".format(check_bokeh()))
+    startup_results = measure_cold_start(args.repeat)
+    stub_providers(args.latency)
+    server_port = get_free_port()
+    start_server(server_port)
+    startup_results.update(measure_sessions(args.repeat, server_port))
+    print_results(startup_results)
+    if args.save:
+        with open(args.save, "w") as results_file:
+            json.dump(startup_results, results_file, indent=2)
@@ -0,0 +1,260 @@
+"""
+Headless HTTP API of the merged forecasts (City.union), backed by the same process-wide forecast cache as the
+Bokeh app.
+
+    $ python forecast_api.py --port 5007
+
+    GET /forecast/Tallinn                       JSON (columns; datetimes as UTC epoch milliseconds)
+    GET /forecast/Tallinn?format=arrow          Arrow IPC stream (needs pyarrow)
+    GET /forecast?cities=Tallinn,Tartu          Batch of cities
+    GET /forecast/Tallinn?resolution=6h         Resampled to 3h or 6h (see forecast_merge.resample)
+    GET /metrics                                See metrics.py
+
+Forecast times are local (Europe/Tallinn) wall-clock times: JSON sends the instants they denote, Arrow sends
+timestamps with the time zone attached. Responses are gzipped if the client accepts it and carry an ETag
+(If-None-Match is answered with 304).
+"""
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, unquote, urlparse
+
+import numpy as np
+import pandas as pd
+
+import forecast_batch
+import forecast_cache
+import forecast_merge
+import metrics
+import prefetch
+from locations import CATALOG
+from solar import TIMEZONE
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:  # Arrow IPC is optional
+    pyarrow = None
+
+API_COLUMNS = ["start", "end", "temperature_emhi", "temperature_yrno", "precipitation_emhi", "precipitation_yrno",
+               "symbol_emhi", "symbol_yrno", "pressure_emhi", "pressure_yrno", "windDirection_emhi",
+               "windDirection_yrno", "windSpeed_emhi", "windSpeed_yrno"]
+CONTENT_TYPES = {"json": "application/json", "arrow": "application/vnd.apache.arrow.stream"}
+BODY_CACHE_SIZE = 256  # Encoded responses kept in memory
+MAX_AGE = 60  # Seconds; Cache-Control max-age for clients and proxies
+
+_bodies = OrderedDict()  # ETag -> (body, gzipped body)
+_bodies_lock = threading.Lock()
+
+
+def get_etag(cities: list, response_format: str, resolution: str = "1h") -> str:
+    """
+    Returns the ETag of a response, which changes only when a forecast of one of the cities changes (City.version),
+    not on refetches which did not change it. It is weak, as "fetched_at" of a cached body may be that of an
+    earlier fetch of the same forecast.
+    :param cities: list of City
+    :param response_format: str in CONTENT_TYPES
+    :param resolution: str in forecast_merge.RESOLUTIONS
+    :return: str
+    """
+    versions = ";".join("{}@{}{}".format(city.name, city.version, sorted(city.errors)) for city in cities)
+    key = "{}|{}|{}".format(versions, response_format, resolution)
+    return 'W/"{}"'.format(hashlib.sha1(key.encode("utf-8")).hexdigest()[:20])
+
+
+def get_forecast(city, resolution: str) -> pd.DataFrame:
+    """
+    Returns the forecast of city in resolution: City.union as such, or resampled from the providers' forecasts
+    aligned over their whole intervals (see forecast_merge.align).
+    :param city: City
+    :param resolution: str in forecast_merge.RESOLUTIONS
+    :return: pd.DataFrame
+    """
+    if forecast_merge.RESOLUTIONS[resolution] is None:
+        return city.union
+    forecast = forecast_merge.align({"emhi": city.emhi, "yrno": city.yrno}, fill=True)
+    return forecast_merge.resample(forecast, resolution)
+
+
+def localize(series: pd.Series) -> pd.Series:
+    """
+    Returns naive local forecast times as TIMEZONE-aware times. Within the hour repeated when summer time ends, the
+    first occurrence of a time is summer time and a repeat of it winter time; times skipped when summer time starts
+    are moved forward to the first valid time.
+    :param series: pd.Series of naive datetime64
+    :return: pd.Series of datetime64 with tz
+    """
+    return series.dt.tz_localize(TIMEZONE, ambiguous=~series.duplicated().values, nonexistent="shift_forward")
+
+
+def _get_column_values(series: pd.Series) -> list:
+    if series.dtype.kind == "M":
+        utc = localize(series).dt.tz_convert("UTC").dt.tz_localize(None)
+        values = utc.values.astype("datetime64[ms]").astype(np.int64).astype(object)
+        values[series.isnull().values] = None
+        return values.tolist()
+    return series.astype(object).where(series.notnull(), None).tolist()
+
+
+def encode_json(cities: list, resolution: str = "1h") -> bytes:
+    """
+    Returns the forecasts of cities as compact column-oriented JSON.
+    :param cities: list of City
+    :param resolution: str in forecast_merge.RESOLUTIONS
+    :return: bytes; {"forecasts": [{"city": ..., "fetched_at": ..., "columns": {column: [...]}}]}
+    """
+    forecasts = []
+    for city in cities:
+        union = get_forecast(city, resolution)
+        forecasts.append({
+            "city": city.name,
+            "fetched_at": city.fetched_at,
+            "errors": sorted(city.errors),
+            "columns": {column: _get_column_values(union[column]) for column in API_COLUMNS if column in union}
+        })
+    return json.dumps({"forecasts": forecasts}, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def encode_arrow(cities: list, resolution: str = "1h") -> bytes:
+    """
+    Returns the forecasts of cities as one Arrow IPC stream (long format with a city column).
+    :param cities: list of City
+    :param resolution: str in forecast_merge.RESOLUTIONS
+    :return: bytes
+    """
+    frames = []
+    for city in cities:
+        union = get_forecast(city, resolution)
+        # Symbols as plain strings, as the categories differ between cities
+        union = union[[column for column in API_COLUMNS if column in union]].astype(
+            {column: object for column in union.columns if column.startswith("symbol")})
+        union = union.assign(**{column: localize(union[column]) for column in ("start", "end")})
+        frames.append(union.assign(city=city.name))
+    table = pyarrow.Table.from_pandas(pd.concat(frames, ignore_index=True), preserve_index=False)
+    sink = io.BytesIO()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def get_bodies(cities: list, response_format: str, resolution: str, etag: str) -> tuple:
+    """
+    Returns the encoded (and gzipped) response, which is encoded only once per ETag.
+    :return: (bytes, bytes)
+    """
+    with _bodies_lock:
+        bodies = _bodies.get(etag)
+        if bodies is not None:
+            _bodies.move_to_end(etag)
+            return bodies
+    with metrics.timer("api_encode_seconds", format=response_format):
+        if response_format == "arrow":
+            body = encode_arrow(cities, resolution)
+        else:
+            body = encode_json(cities, resolution)
+        bodies = (body, gzip.compress(body, compresslevel=6))
+    with _bodies_lock:
+        _bodies[etag] = bodies
+        while len(_bodies) > BODY_CACHE_SIZE:
+            _bodies.popitem(last=False)
+    return bodies
+
+
+class ForecastHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive for polling clients
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/metrics":
+            self._send(200, metrics.format_text().encode("utf-8"), "text/plain; version=0.0.4")
+            return
+        if url.path.startswith("/forecast/"):
+            names = [unquote(url.path[len("/forecast/"):])]
+        elif url.path == "/forecast" and query.get("cities"):
+            names = [name for name in query["cities"][0].split(",") if name]
+        else:
+            self._send_error(404, "Unknown path")
+            return
+        response_format = query.get("format", ["json"])[0]
+        if response_format not in CONTENT_TYPES:
+            self._send_error(400, "Unknown format: {}".format(response_format))
+            return
+        resolution = query.get("resolution", ["1h"])[0]
+        if resolution not in forecast_merge.RESOLUTIONS:
+            self._send_error(400, "Unknown resolution: {}".format(resolution))
+            return
+        if response_format == "arrow" and pyarrow is None:
+            self._send_error(406, "Arrow format needs pyarrow")
+            return
+        unknown = [name for name in names if CATALOG.resolve(name, prefix=False) is None]
+        if unknown:
+            self._send_error(404, "Unknown city: {}".format(", ".join(unknown)))
+            return
+        names = [CATALOG.resolve(name, prefix=False) for name in names]  # i.e. "parnu" -> "Pärnu"
+
+        cities = forecast_batch.get_cities(names) if len(names) > 1 else [forecast_cache.get_city(names[0])]
+        etag = get_etag(cities, response_format, resolution)
+        metrics.incr("api_requests", format=response_format)
+        if etag in self.headers.get("If-None-Match", ""):
+            metrics.incr("api_not_modified")
+            self._send(304, b"", None, etag)
+            return
+        body, gzipped_body = get_bodies(cities, response_format, resolution, etag)
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            self._send(200, gzipped_body, CONTENT_TYPES[response_format], etag, content_encoding="gzip")
+        else:
+            self._send(200, body, CONTENT_TYPES[response_format], etag)
+
+    def _send(self, status: int, body: bytes, content_type: str = None, etag: str = None,
+              content_encoding: str = None) -> None:
+        self.send_response(status)
+        if content_type:
+            self.send_header("Content-Type", content_type)
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "public, max-age={}".format(MAX_AGE))
+            self.send_header("Vary", "Accept-Encoding")
+        if content_encoding:
+            self.send_header("Content-Encoding", content_encoding)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str) -> None:
+        self._send(status, json.dumps({"error": message}).encode("utf-8"), CONTENT_TYPES["json"])
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def serve(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Serves the API in a background thread (i.e. next to the Bokeh server in the same process).
+    :param port: int
+    :param host: str
+    :return: ThreadingHTTPServer
+    """
+    server = ThreadingHTTPServer((host, port), ForecastHandler)
+    threading.Thread(target=server.serve_forever, name="forecast-api", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5007)
+    args = parser.parse_args()
+    prefetch.start_from_env()
+    metrics.start_from_env()
+    ThreadingHTTPServer((args.host, args.port), ForecastHandler).serve_forever()
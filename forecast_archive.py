@@ -0,0 +1,201 @@
+"""
+Append-only archive of every fetched forecast (City.yrno and City.emhi) as Parquet files partitioned by issue date
+(UTC) and provider, with the city as a column, i.e. for checking the accuracy of the providers or how a forecast
+changed over time:
+
+    <root>/date=2018-03-01/provider=yrno/part-1519862400000-<id>.parquet
+
+Forecasts are buffered per partition and written as one file once ARCHIVE_FILE_ROWS rows have been collected or the
+oldest of them is ARCHIVE_ROLLOVER_INTERVAL old, so that a file holds many fetches of many cities instead of one.
+Needs pyarrow. Queries read only the partitions of the requested provider and issue-time range.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+import metrics
+from forecast_data import FORECAST_COLUMNS, PROVIDERS
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # The archive is optional
+    pyarrow = None
+
+ARCHIVE_QUEUE_SIZE = 256  # Frames waiting to be buffered; bounds the memory used by the queue
+ARCHIVE_FILE_ROWS = 100000  # Buffered rows of a partition, which are written as one file
+ARCHIVE_ROLLOVER_INTERVAL = 900  # Seconds; a partition's buffer is written after this even if it has fewer rows
+_FLUSH = object()  # Queued by ForecastArchive.flush; writes all buffers
+
+logger = logging.getLogger(__name__)
+
+
+def _to_datetime(value) -> datetime:
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    return datetime.fromtimestamp(value, tz=timezone.utc)  # Epoch seconds
+
+
+class ForecastArchive(object):
+    """
+    Writes forecasts in a background thread (bulk writer) from a bounded queue, so that archiving neither
+    blocks nor slows down fetching, and memory does not grow if the disk is slower than the fetch rate.
+    Buffered forecasts are written on close (also at interpreter exit) and flush.
+    """
+    def __init__(self, root: str, queue_size: int = ARCHIVE_QUEUE_SIZE, file_rows: int = ARCHIVE_FILE_ROWS,
+                 rollover_interval: float = ARCHIVE_ROLLOVER_INTERVAL):
+        if pyarrow is None:
+            raise RuntimeError("The forecast archive needs pyarrow")
+        self.root = root  # str
+        self.file_rows = file_rows  # int
+        self.rollover_interval = rollover_interval  # float, seconds
+        self._queue = queue.Queue(maxsize=queue_size)  # (city, provider, issued_at, pd.DataFrame), _FLUSH or None
+        self._buffers = {}  # partition dir -> [started (monotonic), rows, list of pd.DataFrame]; writer thread only
+        self._thread = threading.Thread(target=self._run, name="forecast-archive", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def get_partition_dir(self, provider: str, issued_at: datetime) -> str:
+        """
+        :param provider: str in PROVIDERS
+        :param issued_at: datetime, tz-aware
+        :return: str
+        """
+        return os.path.join(self.root, "date={:%Y-%m-%d}".format(issued_at.astimezone(timezone.utc)),
+                            "provider={}".format(provider))
+
+    def append(self, city, previous=None) -> None:
+        """
+        Queues the forecasts of city for writing, without waiting: if the queue is full (the disk is slower than
+        fetching), the forecast is dropped and counted (archive_dropped). Failed providers (City.errors) and
+        forecasts reused from previous (i.e. not modified since then) are skipped.
+        :param city: forecast_data.City
+        :param previous: forecast_data.City or None, the City which city replaced
+        :return: None
+        """
+        issued_at = _to_datetime(city.fetched_at)
+        for provider in PROVIDERS:
+            frame = getattr(city, provider)
+            if provider in city.errors or frame.empty:
+                continue
+            if previous is not None and frame is getattr(previous, provider):
+                continue
+            try:
+                self._queue.put_nowait((city.name, provider, issued_at, frame))
+            except queue.Full:
+                metrics.incr("archive_dropped", provider=provider)
+                logger.warning("Archive queue is full, dropped %s forecast of %s", provider, city.name)
+
+    def flush(self) -> None:
+        """
+        Waits until all queued and buffered forecasts are written.
+        :return: None
+        """
+        self._queue.put(_FLUSH)
+        self._queue.join()
+
+    def close(self) -> None:
+        """
+        Writes the queued and buffered forecasts and stops the writer thread.
+        :return: None
+        """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            timeout = None  # Wait for a forecast as long as nothing is buffered
+            if self._buffers:
+                oldest = min(buffer[0] for buffer in self._buffers.values())
+                timeout = max(oldest + self.rollover_interval - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._write_buffers(force=False)
+                continue
+            if item is None or item is _FLUSH:
+                self._write_buffers(force=True)
+                self._queue.task_done()
+                if item is None:
+                    return
+                continue
+            city, provider, issued_at, frame = item
+            partition_dir = self.get_partition_dir(provider, issued_at)
+            buffer = self._buffers.setdefault(partition_dir, [time.monotonic(), 0, []])
+            buffer[1] += len(frame)
+            buffer[2].append(frame.assign(city=city, issued_at=pd.Timestamp(issued_at)))
+            self._write_buffers(force=False)
+            self._queue.task_done()  # Buffered; flush and close wait for the buffers with a queued _FLUSH/None
+
+    def _write_buffers(self, force: bool) -> None:
+        """
+        Writes the buffers which are full or old enough (see ARCHIVE_FILE_ROWS, ARCHIVE_ROLLOVER_INTERVAL), or all of
+        them if force. A buffer which could not be written is dropped (and logged), so that it does not grow.
+        :param force: bool
+        :return: None
+        """
+        now = time.monotonic()
+        for partition_dir, (started, rows, frames) in list(self._buffers.items()):
+            if not (force or rows >= self.file_rows or now - started >= self.rollover_interval):
+                continue
+            del self._buffers[partition_dir]
+            try:
+                self._write(partition_dir, frames)
+            except Exception:
+                logger.exception("Writing %s forecasts to the archive failed", len(frames))
+
+    def _write(self, partition_dir: str, frames: list) -> None:
+        """
+        Writes frames as one Parquet file of partition_dir, sorted by city and issue time.
+        :param partition_dir: str, see get_partition_dir
+        :param frames: list of pd.DataFrame with "city" and "issued_at"
+        :return: None
+        """
+        with metrics.timer("archive_write_seconds"):
+            os.makedirs(partition_dir, exist_ok=True)
+            df = pd.concat(frames, ignore_index=True).sort_values(["city", "issued_at", "start"], kind="stable")
+            table = pyarrow.Table.from_pandas(df, preserve_index=False)
+            name = "part-{}-{}.parquet".format(int(frames[0]["issued_at"].iloc[0].timestamp() * 1000),
+                                               uuid.uuid4().hex[:8])
+            path = os.path.join(partition_dir, name)
+            pyarrow.parquet.write_table(table, path + ".tmp")
+            os.replace(path + ".tmp", path)  # Readers never see a half-written file
+        metrics.incr("archive_frames", len(frames))
+        metrics.incr("archive_files")
+
+    def query(self, city: str, provider: str, issued_from, issued_to) -> pd.DataFrame:
+        """
+        Returns the archived forecasts of city and provider issued (fetched) in [issued_from, issued_to].
+        Only the partitions of the dates in the range are read, and of them only the rows of city. Forecasts which
+        are still buffered (see ARCHIVE_ROLLOVER_INTERVAL) are not included; call flush first to include them.
+        :param city: str, city name
+        :param provider: str in PROVIDERS
+        :param issued_from: datetime (naive ones are UTC) or float (epoch seconds)
+        :param issued_to: datetime or float
+        :return: pd.DataFrame; columns of City.yrno/City.emhi + "issued_at" (UTC), sorted by issued_at and start
+        """
+        issued_from, issued_to = _to_datetime(issued_from), _to_datetime(issued_to)
+        paths = []
+        day = issued_from.astimezone(timezone.utc).date()
+        while day <= issued_to.astimezone(timezone.utc).date():
+            partition_dir = self.get_partition_dir(provider, datetime(day.year, day.month, day.day,
+                                                                       tzinfo=timezone.utc))
+            if os.path.isdir(partition_dir):
+                paths.extend(os.path.join(partition_dir, name) for name in sorted(os.listdir(partition_dir))
+                             if name.endswith(".parquet"))
+            day += timedelta(days=1)
+        if not paths:
+            return pd.DataFrame(columns=FORECAST_COLUMNS + ["issued_at"])
+        with metrics.timer("archive_query_seconds"):
+            df = pd.concat([pyarrow.parquet.read_table(path, filters=[("city", "=", city)]).to_pandas()
+                            for path in paths], ignore_index=True).drop(columns="city")
+        df = df[(df["issued_at"] >= pd.Timestamp(issued_from)) & (df["issued_at"] <= pd.Timestamp(issued_to))]
+        return df.sort_values(["issued_at", "start"]).reset_index(drop=True)
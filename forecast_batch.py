@@ -0,0 +1,41 @@
+import concurrent.futures
+from collections import OrderedDict
+
+import pandas as pd
+
+import forecast_cache
+import forecast_merge
+from forecast_data import City
+
+BATCH_MAX_WORKERS = 8  # Amount of cities fetched at the same time (each City fetches 2 providers concurrently).
+
+
+def get_cities(names: list, max_workers: int = BATCH_MAX_WORKERS) -> list:
+    """
+    Returns the City of each name from the process-wide forecast cache; missing cities are fetched with bounded
+    concurrency.
+    :param names: list of str, keys of CITY_MAP
+    :param max_workers: int
+    :return: list of City, in the order of names
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(forecast_cache.get_city, names))
+
+
+def get_forecasts(names: list, max_workers: int = BATCH_MAX_WORKERS) -> pd.DataFrame:
+    """
+    Returns the merged forecasts (City.union) of cities as one long-format dataframe.
+    :param names: list of str, keys of CITY_MAP
+    :param max_workers: int
+    :return: pd.DataFrame; columns of City.union + "city" (categorical); no rows if names is empty
+    """
+    names = list(OrderedDict.fromkeys(name.title() for name in names))  # Unique, same normalization as City
+    if not names:  # pd.concat needs at least one frame
+        df = forecast_merge.align({"emhi": City._empty_df(), "yrno": City._empty_df()})
+        df.insert(0, "city", pd.Categorical([], categories=[]))
+        return df
+    cities = get_cities(names, max_workers)
+    df = pd.concat([city.union for city in cities], keys=[city.name for city in cities], names=["city", None])
+    df = df.reset_index(level="city").reset_index(drop=True)
+    df["city"] = pd.Categorical(df["city"], categories=[city.name for city in cities])
+    return df
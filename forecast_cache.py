@@ -0,0 +1,285 @@
+import concurrent.futures
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import metrics
+from forecast_data import City, PROVIDERS
+
+CACHE_MAX_SIZE = 64  # Amount of cities kept in memory; least recently used cities are evicted first.
+CACHE_TTL = 3600  # Seconds after which a cached forecast is stale (yr.no requires caching for at least 10 min).
+CACHE_ERROR_TTL = 60  # Seconds after which a failed provider is retried (only that provider).
+PROVIDER_MIN_INTERVALS = {"yrno": 600}  # Seconds between requests of one city to a provider, also after failures.
+
+logger = logging.getLogger(__name__)
+
+# City; dicts of provider -> epoch seconds: latest request, and when the provider is to be requested again
+CacheEntry = namedtuple("CacheEntry", ["city", "requested_at", "due_at"])
+
+
+class ForecastCache(object):
+    """
+    Thread-safe LRU cache of parsed City objects. Stale entries are returned immediately while a background
+    worker refreshes them (stale-while-revalidate). Concurrent requests for the same city share one fetch.
+    Every provider has its own schedule: a refresh requests only the providers which are due (i.e. a failed one
+    after error_ttl), the others are reused; see PROVIDER_MIN_INTERVALS.
+    If a ForecastStore is given, misses are first looked up from it and fetched forecasts are saved to it.
+    If a ForecastArchive is given, every fetched (changed) forecast is appended to it.
+    """
+    def __init__(self, max_size: int = CACHE_MAX_SIZE, ttl: float = CACHE_TTL,
+                 error_ttl: float = CACHE_ERROR_TTL, refresh_workers: int = 4,
+                 store: "forecast_store.ForecastStore" = None, archive: "forecast_archive.ForecastArchive" = None):
+        self.max_size = max_size  # int
+        self.ttl = ttl  # float, seconds
+        self.error_ttl = error_ttl  # float, seconds
+        self.store = store  # ForecastStore or None
+        self.archive = archive  # ForecastArchive or None
+        self._entries = OrderedDict()  # city name -> CacheEntry
+        self._inflight = {}  # city name -> concurrent.futures.Future (City)
+        self._lock = threading.Lock()
+        self._refresh_pool = concurrent.futures.ThreadPoolExecutor(max_workers=refresh_workers)
+
+    @staticmethod
+    def _get_key(name: str) -> str:
+        return name.title()  # Same normalization as City._get_city_code
+
+    @staticmethod
+    def _is_stale(entry: CacheEntry) -> bool:
+        return time.time() >= min(entry.due_at.values())
+
+    def _get_ttl(self, city: City, provider: str) -> float:
+        """
+        :param city: City
+        :param provider: str in PROVIDERS
+        :return: float, seconds until provider is requested again for city
+        """
+        ttl = self.error_ttl if provider in city.errors else self.ttl
+        return max(ttl, PROVIDER_MIN_INTERVALS.get(provider, 0))
+
+    def _lookup(self, key: str) -> tuple:
+        """
+        Returns the cached City of key (stale ones are scheduled for a background refresh) or the Future of its
+        fetch; is_owner is True if the caller registered the Future and thus has to resolve it.
+        :param key: str, normalized city name
+        :return: (City or None, concurrent.futures.Future or None, bool), i.e. (city, future, is_owner)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                is_stale = self._is_stale(entry)
+                if is_stale and key not in self._inflight:
+                    future = self._inflight[key] = concurrent.futures.Future()
+                    self._refresh_pool.submit(self._load, key, future)
+                metrics.incr("cache_requests", city=key, result="stale" if is_stale else "hit")
+                return entry.city, None, False
+            future = self._inflight.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = self._inflight[key] = concurrent.futures.Future()
+        if not is_owner:
+            metrics.incr("cache_requests", city=key, result="wait")
+        return None, future, is_owner
+
+    def get(self, name: str) -> City:
+        """
+        Returns the City for name. Fresh and stale entries are returned without waiting (stale ones are also
+        scheduled for a background refresh); on a miss the city is fetched in the calling thread.
+        :param name: str, city name, i.e. key of CITY_MAP
+        :return: City
+        """
+        key = self._get_key(name)
+        city, future, is_owner = self._lookup(key)
+        if city is not None:
+            return city
+        if not is_owner:
+            return future.result()  # Another session is already fetching the same city.
+        return self._restore(key, future) or self._load(key, future)
+
+    def get_async(self, name: str) -> concurrent.futures.Future:
+        """
+        Like get, but never blocks: a miss is restored from the store or fetched by a background worker.
+        The returned Future is already done if the city was cached.
+        :param name: str, city name
+        :return: concurrent.futures.Future (City)
+        """
+        key = self._get_key(name)
+        city, future, is_owner = self._lookup(key)
+        if city is not None:
+            future = concurrent.futures.Future()
+            future.set_result(city)
+        elif is_owner:
+            result = concurrent.futures.Future()  # Resolved with the stored city already, if there is one
+            self._refresh_pool.submit(self._get_missing, key, future, result)
+            return result
+        return future
+
+    def _get_missing(self, key: str, future: concurrent.futures.Future, result: concurrent.futures.Future) -> None:
+        try:
+            result.set_result(self._restore(key, future) or self._load(key, future))
+        except Exception as error:
+            result.set_exception(error)
+
+    def _restore(self, key: str, future: concurrent.futures.Future) -> City:
+        """
+        Returns the City of key from the store (a stale one is also refetched in the background), or None.
+        :param key: str, normalized city name
+        :param future: concurrent.futures.Future registered in ._inflight for key
+        :return: City or None
+        """
+        city, expires_at = None, None
+        if self.store is not None:
+            try:
+                city, expires_at = self.store.load_city(key)
+            except Exception:
+                logger.exception("Loading stored forecast for %s failed", key)
+        if city is None:
+            metrics.incr("cache_requests", city=key, result="miss")
+            return None
+        metrics.incr("cache_requests", city=key, result="store")
+        self._put(key, CacheEntry(city, {provider: city.fetched_at for provider in PROVIDERS},
+                                  {provider: expires_at for provider in PROVIDERS}))
+        if time.time() >= expires_at:
+            self._refresh_pool.submit(self._load, key, future)  # Serve the stored (stale) forecast
+        else:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_result(city)
+        return city
+
+    def refresh(self, name: str) -> City:
+        """
+        Fetches name again (regardless of its age, but not sooner than PROVIDER_MIN_INTERVALS allow) and stores
+        the result. Waits for an already running fetch of the same city instead of starting another one.
+        :param name: str, city name
+        :return: City
+        """
+        key = self._get_key(name)
+        with self._lock:
+            future = self._inflight.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = self._inflight[key] = concurrent.futures.Future()
+        if not is_owner:
+            return future.result()
+        return self._load(key, future, force=True)
+
+    def _load(self, key: str, future: concurrent.futures.Future, force: bool = False) -> City:
+        """
+        Creates the City, stores it and resolves future (on which other waiters of the same city block).
+        Only the providers which are due are requested; with force all which PROVIDER_MIN_INTERVALS allow.
+        :param key: str, normalized city name
+        :param future: concurrent.futures.Future registered in ._inflight for key
+        :param force: bool
+        :return: City
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        previous = entry.city if entry is not None else None
+        started = time.time()
+        reuse = ()
+        if entry is not None:
+            reuse = tuple(provider for provider in PROVIDERS if started < (
+                entry.requested_at[provider] + PROVIDER_MIN_INTERVALS.get(provider, 0) if force
+                else entry.due_at[provider]))
+        if previous is not None and len(reuse) == len(PROVIDERS):  # Nothing is due
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_result(previous)
+            return previous
+        try:
+            with metrics.timer("city_seconds"):
+                city = City(key, previous=previous, reuse=reuse).load()  # Revalidates the cached city
+        except Exception as error:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(error)
+            logger.exception("Fetching forecast for %s failed", key)
+            raise
+        requested_at, due_at = {}, {}
+        for provider in PROVIDERS:
+            if provider in reuse:
+                requested_at[provider], due_at[provider] = entry.requested_at[provider], entry.due_at[provider]
+            else:
+                requested_at[provider], due_at[provider] = started, started + self._get_ttl(city, provider)
+        if previous is not None and all(provider in city.errors for provider in PROVIDERS if provider not in reuse):
+            # Nothing new: keep serving the previous forecast (and its stored copy) and retry when due.
+            logger.warning("Refreshing forecast for %s failed, keeping the previous one", key)
+            self._put(key, CacheEntry(previous, requested_at, due_at))
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_result(previous)
+            return previous
+        if self.store is not None:
+            try:
+                self.store.save(city, min(due_at.values()) - city.fetched_at)
+            except Exception:
+                logger.exception("Saving forecast for %s failed", key)
+        if self.archive is not None:
+            self.archive.append(city, previous)  # Only queued; written by the archive's own thread
+        self._put(key, CacheEntry(city, requested_at, due_at))
+        with self._lock:
+            self._inflight.pop(key, None)
+        future.set_result(city)
+        return city
+
+    def _put(self, key: str, entry: CacheEntry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)  # Evict the least recently used city.
+
+    def __contains__(self, name: str) -> bool:
+        return self._get_key(name) in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Module-level (i.e. process-wide) cache; Bokeh runs the app script per session, but imports modules only once.
+# Created by setup (explicitly, or on the first get_cache), so that importing this module has no side effects.
+CACHE = None  # ForecastCache
+_setup_lock = threading.Lock()
+
+
+def setup(store_path: str = None, archive_path: str = None) -> ForecastCache:
+    """
+    Creates the process-wide cache once; later calls return the existing one.
+    :param store_path: str or None; persist forecasts on disk (see ForecastStore), default FORECAST_STORE_PATH
+    :param archive_path: str or None; archive every fetched forecast (see ForecastArchive, needs pyarrow),
+                         default FORECAST_ARCHIVE_PATH
+    :return: ForecastCache
+    """
+    global CACHE
+    with _setup_lock:
+        if CACHE is None:
+            store_path = store_path or os.environ.get("FORECAST_STORE_PATH")
+            archive_path = archive_path or os.environ.get("FORECAST_ARCHIVE_PATH")
+            store, archive = None, None
+            if store_path:
+                from forecast_store import ForecastStore  # Imports pyarrow, so only if needed
+                store = ForecastStore(store_path)
+            if archive_path:
+                from forecast_archive import ForecastArchive  # Imports pyarrow, so only if needed
+                archive = ForecastArchive(archive_path)
+            CACHE = ForecastCache(store=store, archive=archive)
+        return CACHE
+
+
+def get_cache() -> ForecastCache:
+    """
+    :return: ForecastCache, the process-wide cache (see setup)
+    """
+    return CACHE or setup()
+
+
+def get_city(name: str) -> City:
+    """
+    Returns the (possibly stale) City for name from the process-wide cache.
+    :param name: str, city name
+    :return: City
+    """
+    return get_cache().get(name)
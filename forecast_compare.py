@@ -0,0 +1,68 @@
+from bokeh.plotting import figure, ColumnDataSource
+from bokeh.models import DatetimeTickFormatter, LabelSet
+from bokeh.models.widgets import MultiSelect, Select
+from bokeh.io import curdoc
+from bokeh.layouts import layout
+from bokeh.palettes import Category20
+
+import numpy as np
+import forecast_batch
+
+from default_data import CITY_MAP
+
+DEFAULT_CITIES = ["Tallinn", "Tartu", "Narva", "Pärnu", "Kuressaare"]
+PROVIDERS = {"yrno": "yr.no", "emhi": "Ilmateenistus"}
+
+
+def update() -> None:
+    """
+    Updates the data sources based on the selected cities and provider.
+    :return: None
+    """
+    provider = provider_picker.value
+    f.title.text = "Temperatuurid - {}".format(PROVIDERS[provider])
+    if not city_picker.value:  # All cities deselected
+        source.data = dict(xs=[], ys=[], color=[], city=[])
+        label_source.data = dict(x=[], y=[], city=[], color=[])
+        return
+    forecasts = forecast_batch.get_forecasts(city_picker.value)
+    temperature = "temperature_{}".format(provider)
+    forecasts = forecasts[forecasts[temperature].notnull()]
+
+    xs, ys, colors, names = [], [], [], []
+    for i, (name, forecast) in enumerate(forecasts.groupby("city", sort=False, observed=True)):
+        xs.append(forecast["start"].values.astype('datetime64[ms]').astype(np.float64))
+        ys.append(forecast[temperature].values)
+        colors.append(Category20[20][i % 20])
+        names.append(name)
+    source.data = dict(xs=xs, ys=ys, color=colors, city=names)
+    label_source.data = dict(  # City name at the end of its line
+        x=[x[-1] if len(x) else np.nan for x in xs],
+        y=[y[-1] if len(y) else np.nan for y in ys],
+        city=names,
+        color=colors
+    )
+
+
+city_picker = MultiSelect(value=DEFAULT_CITIES, options=sorted(CITY_MAP), title="Linnad", size=12)
+city_picker.on_change("value", lambda attr, old, new: update())
+provider_picker = Select(value="yrno", options=list(PROVIDERS), title="Ilmaennustus")
+provider_picker.on_change("value", lambda attr, old, new: update())
+
+source = ColumnDataSource(data=dict(xs=[], ys=[], color=[], city=[]))  # One line (xs, ys) per city
+label_source = ColumnDataSource(data=dict(x=[], y=[], city=[], color=[]))
+
+f = figure(x_axis_type='datetime', plot_width=1100, responsive=True)
+f.toolbar_location = None
+f.multi_line(xs="xs", ys="ys", line_color="color", line_width=3, source=source)
+f.add_layout(LabelSet(x="x", y="y", text="city", text_color="color", source=label_source, x_offset=5,
+                      text_font_size="9pt", render_mode='canvas'))
+f.xaxis.formatter = DatetimeTickFormatter(
+    minutes=["%H"], hours=["%H"], days=["%d.%m"], months=["%d.%m"], years=["%d.%m"],
+)
+update()
+
+curdoc().add_root(layout([
+    [f, [provider_picker, city_picker]]
+], responsive=True))
+curdoc().title = "Ilmaennustus - linnade võrdlus"
@@ -2,24 +2,202 @@ import pandas as pd
 import numpy as np
 import xml.etree.ElementTree as ET
 import requests
-import requests_cache
+import io
+import re
+import hashlib
 import json
+import os
+import time
+import threading
+import concurrent.futures
 from datetime import datetime
+import forecast_merge
+import metrics
+import solar
 from default_data import CITY_MAP, ELEMENTS_MAP
+from locations import CATALOG
+from providers import CLIENT
 
-requests_cache.install_cache('forecast_cache', backend='memory', expire_after=3600)
+# Query URL templates ({} is the city code); can be overridden, i.e. with a stand-in upstream for load tests.
+YRNO_QUERY_URL = os.environ.get("FORECAST_YRNO_URL",
+                                r"https://www.yr.no/place/Estonia/{}/forecast_hour_by_hour.xml")
+EMHI_QUERY_URL = os.environ.get("FORECAST_EMHI_URL",
+                                r"http://www.ilmateenistus.ee/wp-content/themes/emhi2013/meteogram.php?locationId={}")
+PROVIDER_TIMEOUTS = {"yrno": 10, "emhi": 10}  # Seconds, passed to ProviderClient.get as timeout.
+# Seconds for fetching (and parsing) all providers of a City. The requests timeout above applies to connecting and
+# to each read separately, so a provider which sends its response slowly could take much longer without this.
+FETCH_DEADLINE = 10
+FORECAST_COLUMNS = ["end", "precipitation", "pressure", "start", "symbol", "temperature", "windDirection",
+                    "windSpeed"]
+FETCH_ERRORS = (requests.RequestException,)  # Raised by City._request if a provider did not deliver its forecast
+PARSE_ERRORS = (ValueError, KeyError, ET.ParseError)  # Raised by City._parse for a malformed forecast
+
+# Shared by all City objects, so that yrno and emhi requests of one City are issued at the same time.
+_fetch_pool = concurrent.futures.ThreadPoolExecutor(max_workers=8)
+
+PROVIDERS = ("yrno", "emhi")
+
+NOT_MODIFIED = object()  # Returned by City._request if the provider answered 304 Not Modified.
+# Start tags of <time> elements, whose name may be followed by any XML whitespace (i.e. a newline), "/" or ">".
+YRNO_TIME_TAG = re.compile(rb"<time[\s/>]")
 
 
 class City(object):
-    def __init__(self, name: str):
+    # Compact representation (no per-instance __dict__), as the cache holds many cities.
+    __slots__ = ("name", "fetched_at", "errors", "validators", "_previous", "_reuse", "_yrno", "_emhi", "_union",
+                 "_version", "_sunrise", "_sunset", "_lock")
+
+    def __init__(self, name: str, previous: "City" = None, reuse: tuple = ()):
+        """
+        Forecasts are fetched lazily, i.e. on the first access of .yrno, .emhi, .union (or .sunrise/.sunset),
+        and each only once. Dependencies: .sunrise/.sunset come from .yrno; .union needs .yrno and .emhi.
+        Use load to fetch everything right away.
+        :param name: str, city name, i.e. key of CITY_MAP
+        :param previous: City or None; an earlier City of the same name, whose forecasts are revalidated
+                         (conditional requests) and reused without parsing if the provider has not changed them.
+        :param reuse: tuple of str in PROVIDERS; forecasts (and errors) taken over from previous without a request,
+                      i.e. providers which are not due for a refresh yet
+        """
         self.name = name  # str
-        self.emhi_url = self._get_city_url("emhi")  # str
-        self.yrno_url = self._get_city_url("yrno")  # str
-        self.sunrise = None  # datetime
-        self.sunset = None  # datetime
-        self.yrno = self.get_yrnodf()  # pd.DataFrame NB! Also sets sunrise and sunset TODO refactor
-        self.emhi = self.get_emhidf()  # pd.DataFrame
-        self.union = self.get_uniondf()  # pd.DataFrame (.yrno + .emhi)
+        self.fetched_at = time.time()  # float, epoch seconds; changes on every refetch, see .version
+        self.errors = {}  # dict; provider -> exception, if the provider's forecast could not be fetched/parsed
+        self.validators = {}  # dict; provider -> {"etag": ..., "last_modified": ...}, see ProviderClient
+        self._previous = previous  # City or None; released once both forecasts are loaded
+        self._reuse = reuse  # tuple of str, see __init__
+        self._yrno = None  # pd.DataFrame or None (not loaded yet)
+        self._emhi = None  # pd.DataFrame or None (not loaded yet)
+        self._union = None  # pd.DataFrame or None (not merged yet)
+        self._version = None  # str or None (not computed yet)
+        self._sunrise = None  # datetime, set with ._yrno
+        self._sunset = None  # datetime, set with ._yrno
+        self._lock = threading.RLock()  # Guards the lazy loading; NB! not picklable, so pickle frames, not cities
+
+    @classmethod
+    def from_frames(cls, name: str, yrno: pd.DataFrame, emhi: pd.DataFrame, sunrise: datetime, sunset: datetime,
+                    fetched_at: float, validators: dict = None) -> "City":
+        """
+        Returns a City built from already parsed forecasts (i.e. without fetching them).
+        :param name: str
+        :param yrno: pd.DataFrame, see get_yrnodf
+        :param emhi: pd.DataFrame, see get_emhidf
+        :param sunrise: datetime
+        :param sunset: datetime
+        :param fetched_at: float, epoch seconds
+        :param validators: dict or None; provider -> {"etag": ..., "last_modified": ...}
+        :return: City
+        """
+        city = cls(name)
+        city.fetched_at = fetched_at
+        city.validators = validators or {}
+        city.sunrise = sunrise
+        city.sunset = sunset
+        city.yrno = yrno
+        city.emhi = emhi
+        return city
+
+    def load(self) -> "City":
+        """
+        Fetches (concurrently) and merges both forecasts now, instead of on first access.
+        :return: City, self
+        """
+        self.union  # Loads .yrno and .emhi as its dependencies
+        return self
+
+    @property
+    def yrno(self) -> pd.DataFrame:
+        if self._yrno is None:
+            self._load_frames(("yrno",))
+        return self._yrno
+
+    @yrno.setter
+    def yrno(self, df: pd.DataFrame):
+        self._yrno = df
+
+    @property
+    def emhi(self) -> pd.DataFrame:
+        if self._emhi is None:
+            self._load_frames(("emhi",))
+        return self._emhi
+
+    @emhi.setter
+    def emhi(self, df: pd.DataFrame):
+        self._emhi = df
+
+    @property
+    def union(self) -> pd.DataFrame:
+        if self._union is None:
+            with self._lock:
+                if self._union is None:
+                    self._load_frames(("yrno", "emhi"))
+                    if self._union is None:  # Not reused from previous
+                        self._union = self.get_uniondf()  # pd.DataFrame (.yrno + .emhi)
+        return self._union
+
+    @union.setter
+    def union(self, df: pd.DataFrame):
+        self._union = df
+        self._version = None
+
+    @property
+    def version(self) -> str:
+        """
+        Fingerprint of the forecast (.union and sun times), which - unlike .fetched_at - changes only if the
+        forecast itself changes, i.e. not on a refetch which the providers answered with 304 Not Modified.
+        :return: str
+        """
+        if self._version is None:
+            digest = hashlib.sha1(pd.util.hash_pandas_object(self.union, index=False).values.tobytes())
+            digest.update("{!r}|{!r}".format(self.sunrise, self.sunset).encode("utf-8"))
+            self._version = digest.hexdigest()[:20]
+        return self._version
+
+    @property
+    def sunrise(self) -> datetime:
+        if self._yrno is None:
+            self._load_frames(("yrno",))
+        return self._sunrise
+
+    @sunrise.setter
+    def sunrise(self, value: datetime):
+        self._sunrise = value
+
+    @property
+    def sunset(self) -> datetime:
+        if self._yrno is None:
+            self._load_frames(("yrno",))
+        return self._sunset
+
+    @sunset.setter
+    def sunset(self, value: datetime):
+        self._sunset = value
+
+    @property
+    def emhi_url(self) -> str:
+        return self._get_city_url("emhi")
+
+    @property
+    def yrno_url(self) -> str:
+        return self._get_city_url("yrno")
+
+    def _load_frames(self, providers: tuple) -> None:
+        """
+        Fetches the forecasts of providers which are not loaded yet (concurrently, see fetch_forecasts).
+        :param providers: tuple of str in ["yrno", "emhi"]
+        :return: None
+        """
+        with self._lock:
+            missing = tuple(p for p in providers if getattr(self, "_" + p) is None)
+            if not missing:
+                return
+            for provider, df in self.fetch_forecasts(missing).items():
+                setattr(self, "_" + provider, df)
+            previous = self._previous
+            if self._yrno is None or self._emhi is None:
+                return
+            if previous is not None and self._yrno is previous.yrno and self._emhi is previous.emhi:
+                self._union = previous.union  # Neither forecast has changed
+                self._version = previous._version
+            self._previous = None  # Don't keep a chain of earlier cities alive
 
     def _get_city_code(self, forecast_provider: str) -> str:
         """
@@ -48,70 +226,209 @@ class City(object):
             url = None  # TODO
         return url
 
+    def _get_query_url(self, forecast_provider: str) -> str:
+        """
+        Returns the URL of the forecast providers machine-readable forecast for the current city.
+        :param forecast_provider: str in ["emhi", "yrno"]
+        :return: str
+        """
+        query_base = YRNO_QUERY_URL if forecast_provider == "yrno" else EMHI_QUERY_URL
+        return query_base.format(self._get_city_code(forecast_provider))
+
+    def _fetch(self, forecast_provider: str, previous: "City" = None):
+        """
+        Downloads the raw forecast of forecast_provider and keeps its validators. See _request.
+        :param forecast_provider: str in ["emhi", "yrno"]
+        :param previous: City or None
+        :return: bytes (yrno XML) or str (emhi JSONP) or NOT_MODIFIED
+        """
+        raw_forecast, self.validators[forecast_provider] = self._request(forecast_provider, previous,
+                                                                         time.monotonic() + FETCH_DEADLINE)
+        return raw_forecast
+
+    def _request(self, forecast_provider: str, previous: "City" = None, deadline: float = None) -> tuple:
+        """
+        Downloads the raw forecast of forecast_provider. Raises requests.RequestException on failure or timeout.
+        Does not modify the City, so a response which arrives after FETCH_DEADLINE is simply dropped.
+        :param forecast_provider: str in ["emhi", "yrno"]
+        :param previous: City or None; if given, the request is conditional on previous' validators.
+        :param deadline: float or None; time.monotonic() after which the download is aborted, see ProviderClient.get
+        :return: (bytes (yrno XML) or str (emhi JSONP) or NOT_MODIFIED, dict or None); raw forecast and validators
+        """
+        validators = None
+        if previous is not None:  # Validators are only kept together with the forecast they belong to
+            validators = previous.validators.get(forecast_provider)
+        with metrics.timer("http_seconds", provider=forecast_provider):
+            response = CLIENT.get(self._get_query_url(forecast_provider),
+                                  timeout=PROVIDER_TIMEOUTS[forecast_provider], validators=validators,
+                                  deadline=deadline)
+        if response.status_code == 304:
+            metrics.incr("provider_fetches", provider=forecast_provider, result="not_modified")
+            return NOT_MODIFIED, validators
+        metrics.incr("provider_fetches", provider=forecast_provider, result="ok")
+        metrics.observe("http_bytes", len(response.content), provider=forecast_provider)
+        raw_forecast = response.content if forecast_provider == "yrno" else response.text
+        return raw_forecast, CLIENT.get_validators(response)
+
+    def _parse(self, forecast_provider: str, raw_forecast) -> pd.DataFrame:
+        with metrics.timer("parse_seconds", provider=forecast_provider):
+            if forecast_provider == "yrno":
+                return self.parse_yrno(raw_forecast)
+            return self.parse_emhi(raw_forecast)
+
+    def fetch_forecasts(self, providers: tuple = PROVIDERS) -> dict:
+        """
+        Fetches the forecasts of providers concurrently and parses each one as soon as its response arrives, so
+        that the total time is about the time of the slower provider (at most FETCH_DEADLINE). If a provider fails
+        or does not answer in time, the exception is stored
+        in .errors and its forecast of the previous City (see __init__) is kept, or the dataframe is left empty
+        (partial result) if there is none. Forecasts which the providers have not changed are reused as well,
+        and those of providers in reuse (see __init__) are not requested at all.
+        Raises KeyError for an unknown city, before any request.
+        :param providers: tuple of str in PROVIDERS
+        :return: dict; provider -> pd.DataFrame
+        """
+        if self.name.title() not in CITY_MAP:  # Not a provider error; must not give an (empty) forecast
+            raise KeyError("Unknown city: {}".format(self.name))
+        deadline = time.monotonic() + FETCH_DEADLINE
+        previous = self._previous
+        frames = {}  # provider -> pd.DataFrame
+        if previous is not None:
+            for provider in providers:
+                if provider in self._reuse:
+                    if provider in previous.errors:
+                        self.errors[provider] = previous.errors[provider]
+                    frames[provider] = self._keep_previous(provider, previous)
+        futures = {_fetch_pool.submit(self._request, provider, previous, deadline): provider
+                   for provider in providers if provider not in frames}
+        try:
+            for future in concurrent.futures.as_completed(futures, timeout=deadline - time.monotonic()):
+                provider = futures[future]
+                try:
+                    raw_forecast, validators = future.result()
+                except FETCH_ERRORS as error:
+                    metrics.incr("provider_fetches", provider=provider, result="error")
+                    self.errors[provider] = error
+                    frames[provider] = self._keep_previous(provider, previous)
+                    continue
+                self.validators[provider] = validators
+                if raw_forecast is NOT_MODIFIED:
+                    frames[provider] = getattr(previous, provider)
+                    if provider == "yrno":
+                        self.sunrise, self.sunset = previous.sunrise, previous.sunset
+                    continue
+                try:
+                    frames[provider] = self._parse(provider, raw_forecast)
+                except PARSE_ERRORS as error:
+                    metrics.incr("provider_fetches", provider=provider, result="parse_error")
+                    self.errors[provider] = error
+                    frames[provider] = self._keep_previous(provider, previous)
+        except concurrent.futures.TimeoutError:
+            for future, provider in futures.items():
+                if provider in frames:
+                    continue
+                future.cancel()  # Not started yet; a running request is aborted at the deadline as well
+                metrics.incr("provider_fetches", provider=provider, result="timeout")
+                self.errors[provider] = requests.Timeout("No forecast from {} in {} s".format(provider,
+                                                                                             FETCH_DEADLINE))
+                frames[provider] = self._keep_previous(provider, previous)
+        return frames
+
+    def _keep_previous(self, provider: str, previous: "City" = None) -> pd.DataFrame:
+        """
+        Returns the forecast of provider from previous (with its validators and sun times), so that a failed
+        refresh does not replace a good forecast; or an empty forecast if there is no previous City.
+        :param provider: str in PROVIDERS
+        :param previous: City or None
+        :return: pd.DataFrame
+        """
+        self.validators.pop(provider, None)  # Set if only parsing failed
+        if previous is None:
+            return self._empty_df()
+        if previous.validators.get(provider):
+            self.validators[provider] = previous.validators[provider]
+        if provider == "yrno":
+            self.sunrise, self.sunset = previous.sunrise, previous.sunset
+        return getattr(previous, provider)
+
+    @classmethod
+    def _empty_df(cls) -> pd.DataFrame:
+        """
+        Returns an empty forecast dataframe; used in place of a forecast which could not be fetched.
+        :return: pd.DataFrame[FORECAST_COLUMNS]
+        """
+        return cls.convert_df_dtypes(pd.DataFrame(columns=FORECAST_COLUMNS))
+
     def get_emhidf(self) -> pd.DataFrame:
         """
         Returns emhi (ilmateenistus.ee) 2-day weather forecast as a dataframe.
         :return: pd.DataFrame[["end", "precipitation", "pressure", "start", "symbol",
                                "temperature", "windDirection", "windSpeed"]]
         """
-        city_code = self._get_city_code("emhi")
-        query_base = r"http://www.ilmateenistus.ee/wp-content/themes/emhi2013/meteogram.php?locationId={}"
-        query_url = query_base.format(city_code)
-        emhi_data = requests.get(query_url).text.replace("callback(", "").replace(");", "")
+        return self.parse_emhi(self._fetch("emhi"))
+
+    def parse_emhi(self, emhi_data: str) -> pd.DataFrame:
+        """
+        Parses emhi JSONP forecast to a dataframe column by column.
+        :param emhi_data: str, JSONP, i.e. 'callback({...});'
+        :return: pd.DataFrame, see get_emhidf
+        """
+        emhi_data = emhi_data.replace("callback(", "").replace(");", "")
         emhi_json = json.loads(emhi_data)["forecast"]["tabular"]["time"]
-        data = [self._return_emhi_hour_data(hour) for hour in emhi_json]
-        df = pd.DataFrame(data)
-        df = df.rename(columns={'phenomen': 'symbol'})  # rename/harmonize emhi 'phenomen' to yrno 'symbol'.
+        df = pd.DataFrame(self._read_emhi_columns(emhi_json), columns=FORECAST_COLUMNS)
         df = self.convert_df_dtypes(df)
-        df['symbol'] = df.apply(self._convert_emhi_symbol, axis=1)  # emhi
+        df['symbol'] = self._convert_emhi_symbols(df['symbol'], df['start'])
         return df
 
     @staticmethod
-    def _return_emhi_hour_data(hour: dict) -> dict:
+    def _read_emhi_columns(emhi_json: list) -> dict:
         """
-        Returns a dict of emhi hourly weather data.
-        :param hour: (json) dict
-        :return: dict; keys are list(ELEMENTS_MAP["emhi"])
+        Returns emhi hourly weather data column by column.
+        :param emhi_json: list of (json) dicts, i.e. forecast/tabular/time
+        :return: dict; column name -> list, keys are "start", "end" and list(ELEMENTS_MAP["emhi"]), where
+                 'phenomen' is renamed/harmonized to yrno 'symbol'
         """
-        hour_data = {
-            "start": hour["@attributes"]["from"],
-            "end": hour["@attributes"]["to"]
+        columns = {
+            "start": [hour["@attributes"]["from"] for hour in emhi_json],
+            "end": [hour["@attributes"]["to"] for hour in emhi_json]
         }
-        for element in hour:
-            if element in ELEMENTS_MAP["emhi"]:
-                hour_data[element] = hour[element]["@attributes"][ELEMENTS_MAP["emhi"][element]]
-        return hour_data
+        for element, attribute in ELEMENTS_MAP["emhi"].items():
+            column = "symbol" if element == "phenomen" else element
+            columns[column] = [hour[element]["@attributes"][attribute] if element in hour else None
+                               for hour in emhi_json]
+        return columns
 
-    def _convert_emhi_symbol(self, row) -> str:
+    def _convert_emhi_symbols(self, phenomens: pd.Series, starts: pd.Series) -> pd.Series:
         """
         Converts emhi phenomens (cloud data) to yrno symbol codes and - when necessary - converts them to nighttime.
-        :param row: pd.DataFrame row
-        :return: str, yrno symbol code
-        """
-        if row.symbol is not None and row.symbol != "":
-            symbol = ELEMENTS_MAP["emhi_symbols"][row.symbol]
-            symbol = self._convert_emhi_symbol_daynight(row.start, symbol)
-            return symbol
-        return np.nan
-
-    def _convert_emhi_symbol_daynight(self, start_date: pd.tslib.Timestamp, symbol: str) -> str:
-        if "d" in symbol and not self._is_daytime(start_date):
-            symbol = symbol.replace("d", "n")
-        return symbol
-
-    def _is_daytime(self, check_datetime: pd.tslib.Timestamp) -> bool:
-        """
-        Returns if check_datetime is in the daytime. Relies on .sunrise and sunset.
-        :param check_datetime: pd.tslib.Timestamp (i.e. pandas dt64 object)
-        :return: bool
-        """
-        t = check_datetime.to_pydatetime()  # Convert pd dt64 to python datetime object
-        # .sunrise and .sunset are based on the first day of the forecast.
-        # As forecast also contains future dates and we don't have their sunrise/sunset time,
-        # we'll just use the same times from first day (i.e hours and seconds from self.sunrise and self.sunset)
-        sunrise = t.replace(hour=self.sunrise.hour, second=self.sunrise.second)
-        sunset = t.replace(hour=self.sunset.hour, second=self.sunset.second)
-        return sunrise <= t <= sunset
+        Empty (or unknown) phenomens are converted to NaN.
+        :param phenomens: pd.Series of str (emhi phenomens)
+        :param starts: pd.Series of dt64, forecast start times
+        :return: pd.Series of str, yrno symbol codes
+        """
+        # Categorical codes index into the array of yrno symbols; code -1 (null, "" or unknown) picks the last NaN.
+        lookup = np.array(list(ELEMENTS_MAP["emhi_symbols"].values()) + [np.nan], dtype=object)
+        codes = pd.Index(list(ELEMENTS_MAP["emhi_symbols"])).get_indexer(phenomens)
+        symbols = pd.Series(lookup[codes], index=phenomens.index)
+        is_night = symbols.str.contains("d", regex=False, na=False) & ~self._is_daytime(starts)
+        return symbols.where(~is_night, symbols.str.replace("d", "n", regex=False))
+
+    def _is_daytime(self, check_datetimes: pd.Series) -> pd.Series:
+        """
+        Returns if check_datetimes are between the sunrise and sunset of their own day (see solar) at the city.
+        :param check_datetimes: pd.Series of dt64
+        :return: pd.Series of bool
+        """
+        location = self._get_location()
+        return solar.is_daytime(location.lat, location.lon, check_datetimes)
+
+    def _get_location(self):
+        """
+        Returns the catalog entry of the city (the name is normalized as in _get_city_code). Raises KeyError if the
+        city is not in the catalog, i.e. its coordinates are unknown.
+        :return: locations.Location
+        """
+        return CATALOG.locations[self.name.title()]
 
     def get_yrnodf(self):
         """
@@ -119,13 +436,18 @@ class City(object):
         :return: pd.DataFrame[["end", "precipitation", "pressure", "start", "symbol",
                                "temperature", "windDirection", "windSpeed"]]
         """
-        city_code = self._get_city_code("yrno")
-        query_url = r"https://www.yr.no/place/Estonia/{}/forecast_hour_by_hour.xml".format(city_code)
-        tree = ET.fromstring(requests.get(query_url).content)
-        self.sunrise = self.str_to_dt(tree.find("sun").attrib["rise"])
-        self.sunset = self.str_to_dt(tree.find("sun").attrib["set"])
-        data = [self._return_yrno_hour_data(hour) for hour in tree.findall("forecast/tabular/time")]
-        df = pd.DataFrame(data)
+        return self.parse_yrno(self._fetch("yrno"))
+
+    def parse_yrno(self, yrno_data: bytes) -> pd.DataFrame:
+        """
+        Parses yrno XML forecast to a dataframe. Also sets .sunrise and .sunset.
+        :param yrno_data: bytes, XML
+        :return: pd.DataFrame, see get_yrnodf
+        """
+        columns, sun = self._read_yrno_columns(yrno_data)
+        self.sunrise = self.str_to_dt(sun["rise"])
+        self.sunset = self.str_to_dt(sun["set"])
+        df = pd.DataFrame(columns, columns=FORECAST_COLUMNS)
         df = self.convert_df_dtypes(df)
         return df
 
@@ -134,23 +456,46 @@ class City(object):
         return datetime.strptime(date_string, "%Y-%m-%dT%H:%M:%S")
 
     @staticmethod
-    def _return_yrno_hour_data(hour: ET.Element) -> dict:
+    def _read_yrno_columns(yrno_data: bytes) -> tuple:
         """
-        Returns a dict of yrno hourly weather data.
-        :param hour: xml.etree.ElementTree.Element
-        :return: dict; keys are list(ELEMENTS_MAP["yrno"])
+        Reads yrno hourly weather data (forecast/tabular/time elements) and the sun element with a streaming
+        parser. Values are written straight into preallocated column arrays and every parsed <time> element is
+        freed right away, so the full tree is never held in memory.
+        :param yrno_data: bytes, XML
+        :return: (dict, dict); column name -> np.ndarray (keys are "start", "end" + list(ELEMENTS_MAP["yrno"])),
+                 and the attributes of the sun element (i.e. {"rise": ..., "set": ...})
         """
-        hour_data = {
-            "start": hour.attrib["from"],
-            "end": hour.attrib["to"]
-        }
-        for element in hour.iter():
-            el_tag = element.tag
-            if el_tag in ELEMENTS_MAP["yrno"]:
-                element_name = el_tag
-                element_value = element.attrib[ELEMENTS_MAP["yrno"][el_tag]]
-                hour_data[element_name] = element_value
-        return hour_data
+        rows = len(YRNO_TIME_TAG.findall(yrno_data))  # Upper bound of the amount of hours.
+        columns = {"start": np.empty(rows, dtype=object), "end": np.empty(rows, dtype=object)}
+        for element_name in ELEMENTS_MAP["yrno"]:
+            if element_name == "symbol":
+                columns[element_name] = np.full(rows, np.nan, dtype=object)
+            else:
+                columns[element_name] = np.full(rows, np.nan)
+        sun = {}
+        tabular = None  # ET.Element, parent of the <time> elements while it is being parsed
+        i = -1
+        for event, element in ET.iterparse(io.BytesIO(yrno_data), events=("start", "end")):
+            tag = element.tag
+            if event == "start":  # Attributes are already available on "start"
+                if tag == "tabular":
+                    tabular = element
+                elif tabular is None:
+                    continue
+                elif tag == "time":
+                    i += 1
+                    columns["start"][i] = element.attrib["from"]
+                    columns["end"][i] = element.attrib["to"]
+                elif tag in ELEMENTS_MAP["yrno"]:
+                    value = element.attrib[ELEMENTS_MAP["yrno"][tag]]
+                    columns[tag][i] = value if tag == "symbol" else float(value)
+            elif tag == "time" and tabular is not None:
+                tabular.clear()  # Free the parsed hour
+            elif tag == "tabular":
+                tabular = None
+            elif tag == "sun":
+                sun = dict(element.attrib)
+        return {column: values[:i + 1] for column, values in columns.items()}, sun
 
     @staticmethod
     def convert_df_dtypes(df: pd.DataFrame) -> pd.DataFrame:
@@ -160,16 +505,16 @@ class City(object):
         :param df: pd.DataFrame
         :return: pd.DataFrame
         """
-        columns_to_float = ['pressure', 'temperature', 'windDirection', 'windSpeed', 'precipitation']
-        df[columns_to_float] = df[columns_to_float].astype(float, errors='ignore')
-        df['start'] = pd.to_datetime(df['start'], format='%Y-%m-%dT%H:%M:%S', errors='coerce')
-        df['end'] = pd.to_datetime(df['end'], format='%Y-%m-%dT%H:%M:%S', errors='coerce')
+        with metrics.timer("convert_df_dtypes_seconds"):
+            columns_to_float = ['pressure', 'temperature', 'windDirection', 'windSpeed', 'precipitation']
+            df[columns_to_float] = df[columns_to_float].astype(float, errors='ignore')
+            df['start'] = pd.to_datetime(df['start'], format='%Y-%m-%dT%H:%M:%S', errors='coerce')
+            df['end'] = pd.to_datetime(df['end'], format='%Y-%m-%dT%H:%M:%S', errors='coerce')
         return df
 
     def get_uniondf(self) -> pd.DataFrame:
         """
-        Returns .emhi and .yrno outer-joined dataframe.
+        Returns .emhi and .yrno aligned on one time grid (see forecast_merge.align).
         :return: pd.DataFrame
         """
-        df = pd.merge(self.emhi, self.yrno, how="outer", on=["start", "end"], suffixes=["_emhi", "_yrno"])
-        return df
+        return forecast_merge.align({"emhi": self.emhi, "yrno": self.yrno})
@@ -0,0 +1,157 @@
+"""
+Pre-renders the forecast page (the same figure as forecast_visualize.py, without the city picker) of every
+CITY_MAP city as a standalone HTML file and optionally as a PNG, i.e. for serving read-mostly traffic as static
+files. Only cities whose forecast has changed since the previous run (see manifest.json in the output directory)
+are rendered; rendering runs in a process pool.
+
+    $ python forecast_export.py --out-dir static
+    $ python forecast_export.py --out-dir static --cities Tallinn Tartu --png
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import shutil
+
+import pandas as pd
+
+import forecast_batch
+from default_data import CITY_MAP
+
+EXPORT_MAX_WORKERS = os.cpu_count() or 2  # Rendering is CPU-bound, so one process per core.
+MANIFEST_NAME = "manifest.json"  # city -> fingerprint of its rendered forecast
+SYMBOLS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "symbols")
+
+INDEX_TEMPLATE = """<!DOCTYPE html>
+<html lang="et">
+<head><meta charset="utf-8"><title>Ilmaennustus</title></head>
+<body>
+<ul>
+{}
+</ul>
+</body>
+</html>
+"""
+
+
+def get_fingerprint(city) -> str:
+    """
+    Returns a fingerprint of the plotted forecast of city, which changes only if the forecast itself changes
+    (unlike City.fetched_at, which changes on every refetch); see City.version.
+    :param city: forecast_data.City
+    :return: str
+    """
+    return city.version
+
+
+def get_file_name(city_name: str, extension: str) -> str:
+    """
+    :param city_name: str
+    :param extension: str, i.e. "html"
+    :return: str, i.e. "Tallinn.html"
+    """
+    return "{}.{}".format(city_name.replace("/", "_"), extension)
+
+
+def load_manifest(out_dir: str) -> dict:
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as manifest_file:
+        return json.load(manifest_file)
+
+
+def save_manifest(out_dir: str, manifest: dict) -> None:
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, ensure_ascii=False, sort_keys=True)
+    os.replace(path + ".tmp", path)  # Atomic, so that an interrupted run does not lose the manifest
+
+
+def render(out_dir: str, name: str, yrno: pd.DataFrame, emhi: pd.DataFrame, sunrise, sunset, fetched_at: float,
+           png: bool = False) -> str:
+    """
+    Renders the page of one city (runs in a worker process). Takes the parsed forecasts instead of a City, so
+    that only dataframes are pickled to the worker.
+    :return: str, name of the city
+    """
+    # Imported here, so that the parent process does not need to import bokeh.
+    from bokeh.embed import file_html
+    from bokeh.resources import CDN
+
+    import forecast_payload
+    import forecast_plot
+    from forecast_data import City
+
+    city = City.from_frames(name, yrno, emhi, sunrise, sunset, fetched_at)
+    page = forecast_plot.make_page(city, forecast_payload.build(city))
+    html = file_html(page, CDN, "Ilmaennustus - {}".format(name))
+    path = os.path.join(out_dir, get_file_name(name, "html"))
+    with open(path + ".tmp", "w", encoding="utf-8") as html_file:
+        html_file.write(html)
+    os.replace(path + ".tmp", path)  # Never serve a half-written page
+    if png:
+        from bokeh.io import export_png  # Needs selenium and a webdriver
+        export_png(page, filename=os.path.join(out_dir, get_file_name(name, "png")))
+    return name
+
+
+def write_index(out_dir: str, names: list) -> None:
+    items = "\n".join('<li><a href="{}">{}</a></li>'.format(get_file_name(name, "html"), name)
+                      for name in sorted(names))
+    with open(os.path.join(out_dir, "index.html"), "w", encoding="utf-8") as index_file:
+        index_file.write(INDEX_TEMPLATE.format(items))
+
+
+def export(out_dir: str, names: list, max_workers: int = EXPORT_MAX_WORKERS, png: bool = False,
+           force: bool = False) -> list:
+    """
+    Renders the pages of cities, whose forecast has changed since the previous export to out_dir.
+    Cities with failed forecasts (City.errors) are not rendered, so the previous page is kept.
+    :param out_dir: str
+    :param names: list of str, keys of CITY_MAP
+    :param max_workers: int, amount of rendering processes
+    :param png: bool, also export PNG images
+    :param force: bool, render all cities
+    :return: list of str, the rendered cities
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    symbols_dir = os.path.join(out_dir, "symbols")
+    if not os.path.exists(symbols_dir):
+        shutil.copytree(SYMBOLS_DIR, symbols_dir)
+    manifest = load_manifest(out_dir)
+    changed = {}  # city -> (City, fingerprint)
+    for city in forecast_batch.get_cities(names):
+        if city.errors:
+            continue
+        fingerprint = get_fingerprint(city)
+        if force or manifest.get(city.name) != fingerprint \
+                or not os.path.exists(os.path.join(out_dir, get_file_name(city.name, "html"))):
+            changed[city.name] = (city, fingerprint)
+
+    rendered = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(render, out_dir, city.name, city.yrno, city.emhi, city.sunrise, city.sunset,
+                               city.fetched_at, png)
+                   for city, _ in changed.values()]
+        for future in concurrent.futures.as_completed(futures):
+            name = future.result()
+            manifest[name] = changed[name][1]
+            rendered.append(name)
+    save_manifest(out_dir, manifest)
+    write_index(out_dir, [name for name in manifest
+                          if os.path.exists(os.path.join(out_dir, get_file_name(name, "html")))])
+    return rendered
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out-dir", default="static")
+    parser.add_argument("--cities", nargs="*", default=list(CITY_MAP), help="default: all CITY_MAP cities")
+    parser.add_argument("--workers", type=int, default=EXPORT_MAX_WORKERS, help="amount of rendering processes")
+    parser.add_argument("--png", action="store_true", help="also export PNG images (needs selenium)")
+    parser.add_argument("--force", action="store_true", help="render all cities, even if unchanged")
+    args = parser.parse_args()
+    rendered_cities = export(args.out_dir, [name.title() for name in args.cities], args.workers, args.png,
+                             args.force)
+    print("Rendered {} of {} cities".format(len(rendered_cities), len(args.cities)))
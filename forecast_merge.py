@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+import metrics
+
+VALUE_COLUMNS = ["precipitation", "pressure", "symbol", "temperature", "windDirection", "windSpeed"]
+# Values which describe the state during the whole interval of a forecast row (i.e. a 6h emhi row); with fill they
+# are aligned to every grid time within the interval. Precipitation (an amount) and symbol only to the first one.
+STATE_COLUMNS = ["pressure", "temperature", "windDirection", "windSpeed"]
+RESOLUTIONS = {"1h": None, "3h": "3h", "6h": "6h"}  # Resolution -> resampling frequency (None = as fetched)
+
+
+def align(frames: dict, fill: bool = False) -> pd.DataFrame:
+    """
+    Aligns the forecasts of providers onto one sorted time grid (the union of their start times), one row per
+    start time. Without fill, the values of a provider are only at its own start times (NaN elsewhere), i.e. the
+    plot joins a provider's points as before; with fill, a row of a provider is joined by its interval
+    [start, end), see STATE_COLUMNS (used for resampling).
+    :param frames: dict; provider -> pd.DataFrame (see City.get_yrnodf), i.e. {"emhi": ..., "yrno": ...}
+    :param fill: bool
+    :return: pd.DataFrame; "start", "end" and <value column>_<provider> of VALUE_COLUMNS; symbols are categorical
+    """
+    with metrics.timer("merge_seconds"):
+        frames = {provider: df[df["start"].notnull()].drop_duplicates("start").sort_values("start")
+                  for provider, df in frames.items()}
+        starts = np.unique(np.concatenate([df["start"].values for df in frames.values()]))  # Sorted
+        ends = np.full(len(starts), np.datetime64("NaT"), dtype=starts.dtype)
+        columns = {}
+        for provider, df in frames.items():
+            if df.empty:  # Failed provider
+                for column in VALUE_COLUMNS:
+                    columns["{}_{}".format(column, provider)] = pd.Categorical([None] * len(starts)) \
+                        if column == "symbol" else np.full(len(starts), np.nan)
+                continue
+            provider_starts = df["start"].values.astype(starts.dtype)
+            provider_ends = df["end"].values.astype(starts.dtype)
+            positions = np.searchsorted(provider_starts, starts, side="right") - 1  # Row starting at or before
+            has_row = positions >= 0
+            positions[~has_row] = 0
+            row_ends = provider_ends[positions]
+            starts_here = has_row & (provider_starts[positions] == starts)
+            covered = has_row & (starts < row_ends)  # False for NaT ends
+            # The end of a grid row is the earliest end of the provider rows starting there.
+            ends = np.where(starts_here & (np.isnat(ends) | (row_ends < ends)), row_ends, ends)
+            for column in VALUE_COLUMNS:
+                values = df[column].values[positions]
+                if column == "symbol":
+                    values = pd.Categorical(np.where(starts_here, values.astype(object), None))
+                else:
+                    is_aligned = covered if fill and column in STATE_COLUMNS else starts_here
+                    values = np.where(is_aligned, values.astype(float), np.nan)
+                columns["{}_{}".format(column, provider)] = values
+        return pd.DataFrame(dict(start=starts, end=ends, **columns))
+
+
+def resample(forecast: pd.DataFrame, resolution: str) -> pd.DataFrame:
+    """
+    Returns forecast (see align) with one row per resolution, i.e. for long-range views: precipitation is summed,
+    the first symbol is kept, other values are averaged.
+    :param forecast: pd.DataFrame, see align; with fill, so that a long provider row counts in every bucket
+    :param resolution: str in RESOLUTIONS
+    :return: pd.DataFrame, with the same columns as forecast
+    """
+    freq = RESOLUTIONS[resolution]
+    if freq is None:
+        return forecast
+    with metrics.timer("resample_seconds", resolution=resolution):
+        buckets = forecast["start"].dt.floor(freq)  # Forecast times are local, so buckets start at local midnight
+        grouped = forecast.groupby(buckets.values, sort=True)
+        columns = {}
+        for name in forecast.columns:
+            if name in ("start", "end"):
+                continue
+            if name.startswith("precipitation"):
+                columns[name] = grouped[name].sum(min_count=1)  # All-NaN stays NaN
+            elif name.startswith("symbol"):
+                columns[name] = grouped[name].first()
+            else:
+                columns[name] = grouped[name].mean()
+        df = pd.DataFrame(columns)
+        df.insert(0, "end", df.index + pd.Timedelta(freq))
+        df.insert(0, "start", df.index)
+        return df.reset_index(drop=True)
@@ -0,0 +1,186 @@
+import threading
+import types
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+import midnights
+
+PAYLOAD_CACHE_SIZE = 64  # Amount of cities, whose payloads are kept; see forecast_cache.CACHE_MAX_SIZE
+
+# Derived plot data of one forecast version of a city. Shared by all sessions; data arrays are read-only.
+# midnights is the ColumnDataSource data of the day separators, see midnights.get.
+CityPayload = namedtuple("CityPayload", ["name", "version", "data", "temp_plus_dominates", "min_temp", "max_temp",
+                                         "max_precipitation", "midnights"])
+
+_payloads = OrderedDict()  # city name -> CityPayload
+_payloads_lock = threading.Lock()
+
+
+def get(city) -> CityPayload:
+    """
+    Returns the shared payload of city, which is computed only once per forecast version (City.version).
+    Sessions must not modify it; use dict(payload.data) as ColumnDataSource data (arrays are not copied).
+    :param city: forecast_data.City
+    :return: CityPayload
+    """
+    with _payloads_lock:
+        payload = _payloads.get(city.name)
+        if payload is None or payload.version != city.version:
+            payload = _payloads[city.name] = build(city)
+        _payloads.move_to_end(city.name)
+        while len(_payloads) > PAYLOAD_CACHE_SIZE:
+            _payloads.popitem(last=False)
+    return payload
+
+
+def build(city) -> CityPayload:
+    """
+    Computes the payload of city. See get.
+    :param city: forecast_data.City
+    :return: CityPayload
+    """
+    forecast = city.union
+    data = get_source_data(forecast)
+    separators = midnights.get(forecast["start"])
+    for values in list(data.values()) + list(separators.values()):
+        values.flags.writeable = False
+    precipitations = forecast[["precipitation_emhi", "precipitation_yrno"]].values.astype(float)
+    temperatures = forecast[["temperature_emhi", "temperature_yrno"]].values.astype(float)
+    # Ignore "NaN" getting max; no values at all if both providers failed (and there was no earlier forecast).
+    max_precipitation = np.nanmax(precipitations) if not np.isnan(precipitations).all() else 0
+    max_precipitation = (int(max_precipitation) + 2) if (int(max_precipitation) + 2) > 4 else 4  # Standardize result
+    has_temperatures = not np.isnan(temperatures).all()
+    return CityPayload(
+        name=city.name,
+        version=city.version,
+        data=types.MappingProxyType(data),
+        temp_plus_dominates=get_temp_plus_dominates(data),
+        min_temp=np.nanmin(temperatures) if has_temperatures else 0.0,
+        max_temp=np.nanmax(temperatures) if has_temperatures else 0.0,
+        max_precipitation=max_precipitation,
+        midnights=types.MappingProxyType(separators)
+    )
+
+
+def get_source_data(forecast) -> dict:
+    """
+    Returns ColumnDataSource data of a forecast. All columns are NumPy arrays (numeric ones are float64), so that
+    Bokeh can send them as binary arrays instead of JSON lists.
+    :param forecast: pd.DataFrame, City.union
+    :return: dict; column name -> np.ndarray
+    """
+    temp_emhi = jsonize_values(forecast["temperature_emhi"])
+    temp_emhi_plus, temp_emhi_minus = split_temperatures(temp_emhi)
+
+    temp_yrno = jsonize_values(forecast["temperature_yrno"])
+    temp_yrno_plus, temp_yrno_minus = split_temperatures(temp_yrno)
+
+    return dict(
+        start=jsonize_values(forecast["start"]),
+        temp_emhi=temp_emhi,
+        temp_emhi_plus=temp_emhi_plus,
+        temp_emhi_minus=temp_emhi_minus,
+        precipitation_emhi=jsonize_values(forecast["precipitation_emhi"]),
+        temp_yrno=temp_yrno,
+        temp_yrno_plus=temp_yrno_plus,
+        temp_yrno_minus=temp_yrno_minus,
+        precipitation_yrno=jsonize_values(forecast["precipitation_yrno"]),
+        symbol_yrno=jsonize_values(forecast["symbol_yrno"]),
+        symbol_emhi=jsonize_values(forecast["symbol_emhi"])
+    )
+
+
+def get_temp_plus_dominates(data: dict) -> dict:
+    """
+    Compares the amount of ~isnans (i.e. isnotnans), i.e. amount of +/- temps per provider.
+    :param data: dict, see get_source_data
+    :return: {"emhi": bool, "yrno": bool}
+    """
+    return {
+        provider: np.count_nonzero(~np.isnan(data["temp_{}_plus".format(provider)])) >=
+        np.count_nonzero(~np.isnan(data["temp_{}_minus".format(provider)]))
+        for provider in ("emhi", "yrno")
+    }
+
+
+def get_changed_columns(old_data: dict, new_data: dict) -> dict:
+    """
+    Returns the columns of new_data which differ from old_data. If the time axis (start) differs, all columns are
+    returned, as the data source has to be replaced as a whole.
+    :param old_data: dict, current ColumnDataSource data
+    :param new_data: dict (or CityPayload.data), see get_source_data
+    :return: dict; column name -> np.ndarray
+    """
+    if not _columns_equal(old_data.get("start"), new_data["start"]):
+        return new_data
+    return {column: values for column, values in new_data.items()
+            if not _columns_equal(old_data.get(column), values)}
+
+
+def _columns_equal(old_values, new_values) -> bool:
+    if old_values is None or len(old_values) != len(new_values):
+        return False
+    if new_values.dtype.kind == "f":
+        return np.array_equal(np.asarray(old_values, dtype=float), new_values, equal_nan=True)
+    return np.array_equal(np.asarray(old_values, dtype=object), new_values)
+
+
+def jsonize_values(series) -> np.ndarray:
+    """
+    Converts a Pandas series to an array for ColumnDataSource with specific rules for symbol/start and precipitation.
+    :param series: pandas series
+    :return: np.ndarray
+    """
+    if series.name.startswith('symbol') and hasattr(series, "cat"):
+        # Paths are built once per category; code -1 (Null, 2/3 of EMHI symbols) picks the last None.
+        paths = ["symbols/{}.png".format(symbol) for symbol in series.cat.categories]
+        jsonized_values = np.array(paths + [None], dtype=object)[series.cat.codes.values]
+    elif series.name.startswith('symbol'):
+        # Add symbol_path only if the symbol is not Null (2/3 of EMHI symbols are Null); otherwise use None
+        is_symbol = series.notnull().values
+        jsonized_values = np.full(len(series), None, dtype=object)
+        jsonized_values[is_symbol] = ("symbols/" + series[is_symbol].astype(str) + ".png").values
+    elif series.name == "start":
+        # Milliseconds since epoch (float64), i.e. what Bokeh uses for datetimes; sent as a binary array.
+        jsonized_values = series.values.astype('datetime64[ms]').astype(np.float64)
+        jsonized_values[series.isnull().values] = np.nan
+    else:
+        # If not symbols or datetimes, use float('NaN') for empty spaces.
+        jsonized_values = series.values.astype(float)  # Always a copy
+        if series.name.startswith('precipitation'):
+            # Replace 0 precipitation with NaN, otherwise 0-height bars will be shown.
+            jsonized_values[jsonized_values == 0.0] = np.nan
+    return jsonized_values
+
+
+def split_temperatures(temperatures):
+    """
+    Returns an array of positive and an array of negative temperatures, where non-relevant temperatures
+    have been replaced with NaN. The arrays are created bearing in mind, that these temperatures
+    will be used as coordinates to draw lines later on. Thus if a temperatures rises from x = <0 to y = >0,
+    then x - a negative value - is also stored in positive temperatures, so that the line could still start from x.
+    The opposite stands for negative temperatures.
+    Temperatures of 0 degrees will be handled as negatives to avoid line duplication in the visualization stage.
+    :param temperatures: array of temperatures (or a pandas series of temperatures)
+    :return: np.ndarray_of_positive_temperatures, np.ndarray_of_negative_temperatures
+    """
+    temps = np.asarray(temperatures, dtype=float)
+    previous_temps = np.concatenate(([np.nan], temps[:-1]))  # NaN, as the first temperature has no previous one
+    following_temps = np.concatenate((temps[1:], [np.nan]))  # NaN, as the last temperature has no following one
+
+    plus_temps = np.where(temps >= 0, temps, np.nan)
+    # If temperature is below 0, but the following temp is above 0, then keep the negative value
+    # Needed for coordinates of the line.
+    rising = (temps < 0) & (following_temps > 0)
+    plus_temps[rising] = temps[rising]
+    # To avoid duplication of lines at 0 degrees, do not store consecutive (>3) 0s (i.e 1, 0, 0, 0, 2)
+    # Non-consecutive zero temperatures are stored normally (i.e -1, 0, 2 and -1, 0, 0, 2)
+    plus_temps[(temps == 0) & (previous_temps == 0) & (following_temps == 0)] = np.nan
+
+    minus_temps = np.where(temps <= 0, temps, np.nan)
+    # See above; needed for coordinates of the line.
+    falling = (temps > 0) & (following_temps < 0)
+    minus_temps[falling] = temps[falling]
+
+    return plus_temps, minus_temps
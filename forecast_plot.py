@@ -0,0 +1,161 @@
+from bokeh.plotting import figure, ColumnDataSource
+from bokeh.models import DatetimeTickFormatter, Range1d, LinearAxis, \
+    SingleIntervalTicker, LabelSet
+from bokeh.models.widgets import Div
+from bokeh.layouts import layout
+
+import numpy as np
+
+
+def make_figure() -> figure:
+    """
+    Returns an empty forecast figure; glyphs are added with add_glyphs once the data source has data.
+    :return: bokeh.plotting.figure
+    """
+    return figure(x_axis_type='datetime', plot_width=1300, responsive=True, name="forecast")
+
+
+def add_glyphs(f: figure, source: ColumnDataSource, separators: ColumnDataSource, payload) -> None:
+    """
+    Adds glyphs, labels, axes and day separators of the forecast to f.
+    :param f: bokeh.plotting.figure, see make_figure
+    :param source: ColumnDataSource with forecast_payload.get_source_data columns
+    :param separators: ColumnDataSource with the day separators of the forecast (CityPayload.midnights)
+    :param payload: forecast_payload.CityPayload, used for ranges and line order
+    :return: None
+    """
+    # DISABLE TOOLBAR
+    f.toolbar_location = None
+    f.toolbar.logo = None
+    f.toolbar.active_drag = None
+
+    # ADD GLYPHS
+    # EMHI preciptitation vbar + EMHI above 0 (firebrick) line + EMHI below 0 (#48AFE8) line
+    f.vbar(x="start", top="precipitation_emhi", bottom=0, width=get_precipitation_bar_width(source),
+           source=source, y_range_name="precip", alpha=0.5, legend="Ilmateenistus")
+    line_pos_and_color = get_line_position_and_color(source, "emhi", payload.temp_plus_dominates)
+    f.line(**line_pos_and_color[0], legend="Ilmateenistus", line_width=5)
+    f.line(**line_pos_and_color[1], legend="Ilmateenistus", line_width=5)
+
+    # YRNO preciptitation vbar + YRNO above 0 (firebrick) line + YRNO below 0 (#48AFE8) line
+    f.vbar(x="start", top="precipitation_yrno", bottom=0, width=get_precipitation_bar_width(source),
+           source=source, y_range_name="precip", alpha=0.5, color="DarkCyan", legend="yr.no")
+    line_pos_and_color = get_line_position_and_color(source, "yrno", payload.temp_plus_dominates)
+    f.line(**line_pos_and_color[0], legend="yr.no", line_dash="dashed", line_dash_offset=5, line_width=5)
+    f.line(**line_pos_and_color[1], legend="yr.no", line_dash="dashed", line_dash_offset=5, line_width=5)
+
+    # ADD PRECIPITATION LABELS
+    precipitation_labels_emhi = LabelSet(x="start", y="precipitation_emhi", source=source,
+                                         text="precipitation_emhi", level='glyph', text_font_size="0.5em",
+                                         x_offset=-5, y_offset=5, render_mode='canvas', y_range_name="precip")
+    precipitation_labels_yrno = LabelSet(x="start", y="precipitation_yrno", source=source,
+                                         text="precipitation_yrno", level='glyph', text_font_size="0.5em",
+                                         x_offset=-5, y_offset=5, render_mode='canvas', y_range_name="precip")
+    f.add_layout(precipitation_labels_emhi)
+    f.add_layout(precipitation_labels_yrno)
+
+    # ADD SYMBOLS (CLOUDINESS ETC), i.e. LABELS
+    f.image_url(url="symbol_yrno", x="start", y="temp_yrno", w=None, h=None, anchor="bottom_center", source=source,
+                global_alpha=0.5)
+    f.image_url(url="symbol_emhi", x="start", y="temp_emhi", w=None, h=None, anchor="top_center", source=source)
+
+    # AXIS ETC
+    # DATETIME (X) FORMAT
+    f.xaxis.formatter = DatetimeTickFormatter(
+        minutes=["%H"], hours=["%H"], days=["%H"], months=["%H"], years=["%H"],
+    )
+    f.xaxis[0].ticker.desired_num_ticks = 30  # 10 ~ 6h/tick, 30 ~ 2h/tick; 40 ~ h/tick;
+
+    # TEMPERATURE (Y1 - LEFT)
+    min_temp = payload.min_temp
+    max_temp = payload.max_temp
+
+    f.y_range = Range1d(start=min_temp - 4, end=max_temp + 4)
+    f.yaxis[0].ticker = SingleIntervalTicker(interval=1)
+    f.yaxis[0].ticker.num_minor_ticks = 2
+
+    # PRECIPITATION (Y2 - RIGHT)
+    f.extra_y_ranges = {"precip": Range1d(start=0, end=payload.max_precipitation)}
+    f.add_layout(LinearAxis(y_range_name="precip"), "right")
+
+    # DAY SEPARATORS (MIDNIGHT LINES)
+    # One ray and one label set for all days (instead of a Span and a Label per day); vertical rays of infinite
+    # length (0) from the bottom of the temperature range.
+    f.ray(x="x", y=min_temp - 4, length=0, angle=90, angle_units="deg", source=separators,
+          line_color='DimGray', line_width=2, level="underlay")
+    midnight_labels = LabelSet(x="x", y=max_temp + 4, text="text", source=separators,
+                               x_offset=5, y_offset=-20, render_mode='canvas', text_font_size="10pt")
+    f.add_layout(midnight_labels)  # Add titles/labels to the lines
+
+    # LEGEND LOCATION
+    f.legend.location = "top_left"
+
+
+def get_precipitation_bar_width(source: ColumnDataSource) -> float:
+    """
+    Returns a responsive size to precipitation bars.
+    :param source: ColumnDataSource
+    :return: float
+    """
+    starts = np.asarray(source.data['start'], dtype=float)
+    if np.isnan(starts).all():  # Empty forecast
+        return 0.0
+    mindate = np.nanmin(starts)
+    maxdate = np.nanmax(starts)
+    return 0.8 * (maxdate - mindate) / len(starts)
+
+
+def get_line_position_and_color(source: ColumnDataSource, provider: str, temp_plus_dominates: dict):
+    """
+    Returns list of two dictionaries with line position (source, x, y) and color. The order of dictionaries in
+    the returned list is based on their plotting order, i.e. dominate temperatures (i.e. above or below zero).
+    If temperatures above zero dominate, the data regarding "minus line" must be plotted first, thus the data
+    of "minus line" will be returned first. Result will be used for unpacking values to line figures.
+    :param source: ColumnDataSource
+    :param provider: str in ["emhi", "yrno"]
+    :param temp_plus_dominates: dict, see forecast_payload.get_temp_plus_dominates
+    :return: [{"y": ..., "x": ..., "source": ..., "color": ...}, same]
+    """
+    defaults = {"x": "start", "source": source}
+    y_and_color_based_on_plus_dominance = {
+        True: {"1y": "minus", "1c": "#48AFE8", "2y": "plus", "2c": "firebrick"},  # True if plus dominates
+        False: {"1y": "plus", "1c": "firebrick", "2y": "minus", "2c": "#48AFE8"},  # False if plus does not dominate
+    }
+    vmap = y_and_color_based_on_plus_dominance[temp_plus_dominates[provider]]
+    return [{"y": "temp_{}_{}".format(provider, vmap["1y"]), "color": vmap["1c"], **defaults},
+            {"y": "temp_{}_{}".format(provider, vmap["2y"]), "color": vmap["2c"], **defaults}]
+
+
+def get_weather_source_text(city) -> str:
+    """
+    Returns the HTML with links to the forecast providers' pages of city.
+    :param city: forecast_data.City
+    :return: str
+    """
+    css_style = 'style="text-decoration: none;color: DimGray; font-size: calc(7px + .5vw);"'
+    return '<link rel="stylesheet" href="https://code.jquery.com/ui/1.10.4/themes/smoothness/' \
+           'jquery-ui.min.css" type="text/css">' \
+           '<a href="{0.yrno_url}" {1}>' \
+           'Ilmaprognoos Yr-lt, mille on loonud Norra Meteoroloogia Instituut ja NRK</a>' \
+           '<br>' \
+           '<a href="{0.emhi_url}" {1}>' \
+           'Ilmaprognoos Riigi Ilmateenistuselt'.format(city, css_style)
+
+
+def make_page(city, payload):
+    """
+    Returns a standalone (i.e. static, without a city picker) forecast layout of city.
+    :param city: forecast_data.City
+    :param payload: forecast_payload.CityPayload of city
+    :return: bokeh layout
+    """
+    source = ColumnDataSource(data=dict(payload.data))
+    separators = ColumnDataSource(data=dict(payload.midnights))
+    f = make_figure()
+    f.title.text = "Ilmaennustus - {}".format(city.name)
+    add_glyphs(f, source, separators, payload)
+    return layout([
+        [f],
+        [Div(text=get_weather_source_text(city))]
+    ], responsive=True, width=1300
+    )
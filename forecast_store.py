@@ -0,0 +1,143 @@
+import sqlite3
+import threading
+from collections import namedtuple
+
+import pandas as pd
+
+from forecast_data import City, PROVIDERS
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:  # The store is optional
+    pyarrow = None
+
+FRAME_FORMAT = "arrow"  # Arrow IPC stream; rows of another format (i.e. pickles of earlier versions) are not read
+
+# frame: pd.DataFrame; fetched_at, expires_at: float (epoch seconds); sunrise, sunset: str (yrno only) or None;
+# validators: {"etag": str or None, "last_modified": str or None}
+StoredForecast = namedtuple("StoredForecast", ["frame", "fetched_at", "expires_at", "sunrise", "sunset",
+                                               "validators"])
+
+
+class ForecastStore(object):
+    """
+    Persistent store of parsed forecasts (one row per city and provider) in an SQLite database, so that a
+    restarted server is warm right away. Several server processes can share the same file (WAL mode).
+    Frames are stored as Arrow IPC streams, i.e. plain data (nothing is executed on loading, unlike pickle), which
+    other pandas versions and processes read as well. Needs pyarrow.
+    """
+    def __init__(self, path: str):
+        if pyarrow is None:
+            raise RuntimeError("The forecast store needs pyarrow")
+        self.path = path  # str
+        self._local = threading.local()  # sqlite3 connections can't be shared between threads
+        with self._connect() as connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS forecasts (
+                    city TEXT NOT NULL,
+                    provider TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    sunrise TEXT,
+                    sunset TEXT,
+                    frame BLOB NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    frame_format TEXT,
+                    PRIMARY KEY (city, provider)
+                )""")
+            columns = [row[1] for row in connection.execute("PRAGMA table_info(forecasts)")]
+            # Store created before conditional requests (etag, last_modified) or Arrow frames (frame_format)
+            for column in ("etag", "last_modified", "frame_format"):
+                if column not in columns:
+                    connection.execute("ALTER TABLE forecasts ADD COLUMN {} TEXT".format(column))
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")  # Readers don't block the writer (other processes)
+            self._local.connection = connection
+        return connection
+
+    def save(self, city: City, ttl: float) -> None:
+        """
+        Stores the forecasts of city, which expire after ttl seconds. Providers which failed (see City.errors)
+        are not stored, so that an earlier forecast of that provider is kept.
+        :param city: City
+        :param ttl: float, seconds
+        :return: None
+        """
+        rows = []
+        for provider in PROVIDERS:
+            if provider in city.errors:
+                continue
+            is_yrno = provider == "yrno"
+            validators = city.validators.get(provider) or {}
+            rows.append((
+                city.name, provider, city.fetched_at, city.fetched_at + ttl,
+                city.sunrise.isoformat() if is_yrno and city.sunrise else None,
+                city.sunset.isoformat() if is_yrno and city.sunset else None,
+                self.encode_frame(getattr(city, provider)),
+                validators.get("etag"), validators.get("last_modified"), FRAME_FORMAT
+            ))
+        with self._connect() as connection:  # One transaction
+            connection.executemany(
+                "INSERT OR REPLACE INTO forecasts (city, provider, fetched_at, expires_at, sunrise, sunset, frame, "
+                "etag, last_modified, frame_format) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+
+    def load(self, name: str) -> dict:
+        """
+        Returns the stored forecasts of city name.
+        :param name: str, city name
+        :return: dict; provider -> StoredForecast
+        """
+        rows = self._connect().execute(
+            "SELECT provider, frame, fetched_at, expires_at, sunrise, sunset, etag, last_modified "
+            "FROM forecasts WHERE city = ? AND frame_format = ?", (name, FRAME_FORMAT)
+        ).fetchall()
+        return {provider: StoredForecast(self.decode_frame(frame), fetched_at, expires_at, sunrise, sunset,
+                                         {"etag": etag, "last_modified": last_modified})
+                for provider, frame, fetched_at, expires_at, sunrise, sunset, etag, last_modified in rows}
+
+    @staticmethod
+    def encode_frame(frame: pd.DataFrame) -> bytes:
+        """
+        :param frame: pd.DataFrame, see City.get_yrnodf
+        :return: bytes, Arrow IPC stream (with the pandas metadata, i.e. dtypes and index)
+        """
+        table = pyarrow.Table.from_pandas(frame)
+        sink = pyarrow.BufferOutputStream()
+        with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    @staticmethod
+    def decode_frame(data: bytes) -> pd.DataFrame:
+        """
+        :param data: bytes, see encode_frame
+        :return: pd.DataFrame
+        """
+        return pyarrow.ipc.open_stream(data).read_all().to_pandas()
+
+    def load_city(self, name: str) -> tuple:
+        """
+        Returns the stored City of name and the time it expires, if both providers are stored.
+        :param name: str, city name
+        :return: (City, float) or (None, None)
+        """
+        stored = self.load(name)
+        if any(provider not in stored for provider in PROVIDERS):
+            return None, None
+        yrno, emhi = stored["yrno"], stored["emhi"]
+        city = City.from_frames(
+            name, yrno.frame, emhi.frame,
+            sunrise=City.str_to_dt(yrno.sunrise) if yrno.sunrise else None,
+            sunset=City.str_to_dt(yrno.sunset) if yrno.sunset else None,
+            fetched_at=min(yrno.fetched_at, emhi.fetched_at),
+            validators={"yrno": yrno.validators, "emhi": emhi.validators}
+        )
+        return city, min(yrno.expires_at, emhi.expires_at)
+
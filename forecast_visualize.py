@@ -1,153 +1,111 @@
-from bokeh.plotting import figure, ColumnDataSource
-from bokeh.models import DatetimeTickFormatter, Range1d, LinearAxis, \
-    SingleIntervalTicker, LabelSet, Label, Span
-from bokeh.models.widgets import Div, AutocompleteInput
-from bokeh.io import curdoc
-from bokeh.layouts import layout
+from functools import partial
 
 import numpy as np
-import pandas as pd
-from forecast_data import City
-import midnights
-
-from default_data import CITY_MAP
-
-
-def update() -> None:
-    """
-    Updates the data source based on the city_picker (i.e. user input) value and changes plot title.
-    :return: None
-    """
-    global source, city, temp_plus_dominates
-    input_city = city_picker.value
-    city = City(input_city)
-    forecast = city.union
+from bokeh.plotting import ColumnDataSource
+from bokeh.models.widgets import AutocompleteInput, Div
+from bokeh.io import curdoc
+from bokeh.layouts import layout
+from tornado.ioloop import IOLoop
 
-    temp_emhi = jsonize_values(forecast["temperature_emhi"])
-    temp_emhi_plus, temp_emhi_minus = split_temperatures(temp_emhi)
+import forecast_cache
+import forecast_payload
+import forecast_plot
+import metrics
+import prefetch
 
-    temp_yrno = jsonize_values(forecast["temperature_yrno"])
-    temp_yrno_plus, temp_yrno_minus = split_temperatures(temp_yrno)
+from locations import CATALOG
 
-    temp_plus_dominates = {  # Compares the amount of ~isnans (i.e. isnotnans), i.e. amount of +/- temps.
-        "emhi": sum(~np.isnan(temp_emhi_plus)) >= sum(~np.isnan(temp_emhi_minus)),  # True/False
-        "yrno": sum(~np.isnan(temp_yrno_plus)) >= sum(~np.isnan(temp_yrno_minus))  # True/False
-    }
-    
-    source.data = dict(
-        start=jsonize_values(forecast["start"]),
-        temp_emhi=temp_emhi,
-        temp_emhi_plus=temp_emhi_plus,
-        temp_emhi_minus=temp_emhi_minus,
-        precipitation_emhi=jsonize_values(forecast["precipitation_emhi"]),
-        temp_yrno=temp_yrno,
-        temp_yrno_plus=temp_yrno_plus,
-        temp_yrno_minus=temp_yrno_minus,
-        precipitation_yrno=jsonize_values(forecast["precipitation_yrno"]),
-        symbol_yrno=jsonize_values(forecast["symbol_yrno"]),
-        symbol_emhi=jsonize_values(forecast["symbol_emhi"])
-    )
-    f.title.text = "Ilmaennustus - {}".format(input_city)
 
 
-def jsonize_values(series) -> list:
+def show(city) -> None:
     """
-    Converts a Pandas series to JSON-compatible list with specific rules for symbol/start and precipitation.
-    :param series: pandas series
-    :return: list
+    Shows the forecast of city: updates the data source (only the changed columns), plot title and links.
+    Runs on the session's thread (i.e. directly or as a next tick callback).
+    :param city: City
+    :return: None
     """
-    pd_series = series.copy()
-    if pd_series.name.startswith('symbol'):
-        symbol_path = "symbols/{}.png"
-        # Add symbol_path only if the symbol is not Null (2/3 of EMHI symbols are Null); otherwise use None
-        jsonized_series = pd_series.apply(lambda x: symbol_path.format(x) if pd.notnull(x) else None)
-    elif pd_series.name == "start":
-        # Convert Pandas datetime objects to Python datetime objects.
-        jsonized_series = pd_series.apply(lambda ts: ts.to_pydatetime())
-    else:
-        if pd_series.name.startswith('precipitation'):
-            # Replace 0 precipitation with NaN, otherwise 0-height bars will be shown.
-            pd_series.replace([0.0], [float('NaN')], inplace=True)
-        # If not symbols or datetimes, use float('NaN') for empty spaces.
-        jsonized_series = pd_series.apply(lambda x: x if pd.notnull(x) else float('NaN'))
-    return jsonized_series
+    global payload
+    with metrics.timer("update_seconds"):
+        with metrics.timer("payload_seconds"):
+            payload = forecast_payload.get(city)  # Shared (read-only) by all sessions of the server process
+
+        changed_data = forecast_payload.get_changed_columns(source.data, payload.data)
+        with metrics.timer("update_source_seconds"):
+            if len(changed_data) == len(payload.data):
+                source.data = dict(changed_data)  # Copies only the dict; the arrays are shared
+            elif changed_data:
+                source.data.update(changed_data)  # Same time axis; only the changed columns are sent as a patch.
+            if not np.array_equal(separators.data["x"], payload.midnights["x"]):  # Texts follow the days
+                separators.data = dict(payload.midnights)
+        metrics.observe("update_payload_bytes", sum(values.nbytes for values in changed_data.values()))
+        if not f.renderers:  # First forecast of the session; ranges are based on it
+            forecast_plot.add_glyphs(f, source, separators, payload)
+        weather_source.text = forecast_plot.get_weather_source_text(city)
+        f.title.text = "Ilmaennustus - {}".format(city.name)
 
 
-def split_temperatures(temperatures):
+def update() -> None:
     """
-    Returns a list of positive and a list of negative temperatures, where non-relevant temperatures
-    have been replaced with float('NaN'). The lists are created bearing in mind, that these temperatures
-    will be used as coordinates to draw lines later on. Thus if a temperatures rises from x = <0 to y = >0,
-    then x - a negative value - is also stored in positive temperatures, so that the line could still start from x.
-    The opposite stands for negative temperatures.
-    Temperatures of 0 degrees will be handled as negatives to avoid line duplication in the visualization stage.
-    :param temperatures: list_of_temperatures (or a pandas series of temperatures)
-    :return: list_of_positive_temperatures, list_of_negative_temperatures
+    Shows the forecast of the city_picker value (i.e. user input). A cached (or stored) forecast is shown right
+    away; otherwise it is fetched in the background and shown on a later tick, so that the session is never
+    blocked on the forecast providers.
+    :return: None
     """
-    plus_temps = []
-    for i, temp in enumerate(temperatures):
-        # If temperature is below 0, but the following temp is above 0, then append the negative value
-        # Needed for coordinates of the line.
-        if temp < 0 and i < len(temperatures) - 1 and temperatures[i + 1] > 0:
-            plus_temps.append(temp)
-        # To avoid duplication of lines at 0 degrees, do not store consecutive (>3) 0s (i.e 1, 0, 0, 0, 2)
-        # Non-consecutive zero temperatures are stored normally (i.e -1, 0, 2 and -1, 0, 0, 2)
-        elif temp == 0 and 0 < i < len(temperatures) - 1 \
-                and temperatures[i-1] == 0 and temperatures[i+1] == 0:
-            plus_temps.append(float('NaN'))
-        # Otherwise use default logic: temperature or float('NaN')
-        else:
-            plus_temps.append(temp if temp >= 0 else float('NaN'))
-
-    minus_temps = []
-    for i, temp in enumerate(temperatures):
-        # See above; needed for coordinates of the line.
-        if temp > 0 and i < len(temperatures) - 1 and temperatures[i + 1] < 0:
-            minus_temps.append(temp)
-        else:
-            minus_temps.append(temp if temp <= 0 else float('NaN'))
-
-    return plus_temps, minus_temps
-
-
-def get_precipitation_bar_width() -> float:
+    input_city = city_picker.value
+    future = forecast_cache.get_cache().get_async(input_city)  # Shared by all sessions of the server process
+    if future.done() and future.exception() is None:
+        show(future.result())
+        return
+    f.title.text = "Ilmaennustus - {} (laadimine...)".format(input_city)
+    # The callback is added on the server's loop, as add_next_tick_callback is not thread-safe in older Bokeh
+    # (the callback could run before it was registered and was then dropped).
+    io_loop = IOLoop.current()
+    future.add_done_callback(lambda done: io_loop.add_callback(
+        doc.add_next_tick_callback, partial(on_city_loaded, input_city, done)))
+
+
+def on_city_loaded(input_city: str, future) -> None:
     """
-    Returns a responsive size to precipitation bars.
-    :return: float
+    Shows the fetched forecast of input_city, unless another city has been picked meanwhile.
     """
-    global source
-    mindate = min(source.data['start'])
-    maxdate = max(source.data['start'])
-    return 0.8 * (maxdate - mindate).total_seconds() * 1000 / len(source.data['start'])
+    if city_picker.value != input_city:
+        return
+    if future.exception() is not None:
+        f.title.text = "Ilmaennustus - {} (ilmaennustust ei õnnestunud laadida)".format(input_city)
+        return
+    show(future.result())
 
 
-def get_line_position_and_color(provider: str):
+def on_city_change(attr, old, new) -> None:
     """
-    Returns list of two dictionaries with line position (source, x, y) and color. The order of dictionaries in
-    the returned list is based on their plotting order, i.e. dominate temperatures (i.e. above or below zero).
-    If temperatures above zero dominate, the data regarding "minus line" must be plotted first, thus the data
-    of "minus line" will be returned first. Result will be used for unpacking values to line figures.
-    :param provider: str in ["emhi", "yrno"]
-    :return: [{"y": ..., "x": ..., "source": ..., "color": ...}, same]
+    Resolves the entered text to a location (i.e. "parnu" -> "Pärnu") and updates the plot; unknown text is ignored.
+    Folding (diacritics, case, hyphens, prefixes) applies here, i.e. when the value is submitted: the browser
+    filters the completions itself, without folding (see LocationCatalog.get_completions).
     """
-    global source
-    defaults = {"x": "start", "source": source}
-    y_and_color_based_on_plus_dominance = {
-        True: {"1y": "minus", "1c": "#48AFE8", "2y": "plus", "2c": "firebrick"},  # True if plus dominates
-        False: {"1y": "plus", "1c": "firebrick", "2y": "minus", "2c": "#48AFE8"},  # False if plus does not dominate
-    }
-    vmap = y_and_color_based_on_plus_dominance[temp_plus_dominates[provider]]
-    return [{"y": "temp_{}_{}".format(provider, vmap["1y"]), "color": vmap["1c"], **defaults},
-            {"y": "temp_{}_{}".format(provider, vmap["2y"]), "color": vmap["2c"], **defaults}]
-
-
-city_picker = AutocompleteInput(value="Tartu", title="\n",
-                                completions=list(CITY_MAP))
-city_picker.on_change("value", lambda attr, old, new: update())
+    name = CATALOG.resolve(new)
+    if name is None:
+        return
+    if name != new:
+        city_picker.value = name  # Calls on_city_change again with the resolved name
+        return
+    update()
+
+
+prefetch.start_from_env()  # Optional; started only once per server process.
+metrics.start_from_env()  # Optional; started only once per server process.
+
+# Completions are static: the browser filters them on every keystroke before a server round trip could update them.
+city_picker = AutocompleteInput(value="Tartu", title="\n", name="city_picker",
+                                completions=CATALOG.get_completions())  # Names and spellings without diacritics
+if "search_strategy" in city_picker.properties():  # Newer Bokeh; older ones match case-insensitive prefixes
+    city_picker.case_sensitive = False  # "tallinn" -> "Tallinn"
+    city_picker.search_strategy = "includes"  # "joesuu" -> "Narva-Joesuu"
+    city_picker.restrict = False  # Other text (i.e. "parn") is submitted as such and resolved by on_city_change
+city_picker.on_change("value", on_city_change)
 
 source = ColumnDataSource(
     data=dict(
-        start=[],  # Python datetime objects
+        start=[],  # Milliseconds since epoch
         temp_emhi=[],  # All EMHI temperatures - needed for the positioning of cloud-symbols.
         temp_emhi_plus=[],  # EMHI temperatures above 0.
         temp_emhi_minus=[],  # EMHI temperatures below 0.
@@ -160,98 +118,13 @@ source = ColumnDataSource(
         symbol_emhi=[]
     )
 )
+separators = ColumnDataSource(data=dict(x=[], text=[]))  # Day separators (midnights) and their labels
 
-f = figure(x_axis_type='datetime', plot_width=1300, responsive=True)
+doc = curdoc()
+f = forecast_plot.make_figure()  # Glyphs are added by show, once the first forecast is available
+weather_source = Div(text="")  # DIV BELOW PLOT (DATA SOURCE)
 update()  # Create the initial (default) plot based on city_picker default values.
 
-# DISABLE TOOLBAR
-f.toolbar_location = None
-f.toolbar.logo = None
-f.toolbar.active_drag = None
-
-
-# ADD GLYPHS
-# EMHI preciptitation vbar + EMHI above 0 (firebrick) line + EMHI below 0 (#48AFE8) line
-f.vbar(x="start", top="precipitation_emhi", bottom=0, width=get_precipitation_bar_width(),
-       source=source, y_range_name="precip", alpha=0.5, legend="Ilmateenistus")
-line_pos_and_color = get_line_position_and_color("emhi")
-f.line(**line_pos_and_color[0], legend="Ilmateenistus", line_width=5)
-f.line(**line_pos_and_color[1], legend="Ilmateenistus", line_width=5)
-
-# YRNO preciptitation vbar + YRNO above 0 (firebrick) line + YRNO below 0 (#48AFE8) line
-f.vbar(x="start", top="precipitation_yrno", bottom=0, width=get_precipitation_bar_width(),
-       source=source, y_range_name="precip", alpha=0.5, color="DarkCyan", legend="yr.no")
-line_pos_and_color = get_line_position_and_color("yrno")
-f.line(**line_pos_and_color[0], legend="yr.no", line_dash="dashed", line_dash_offset=5, line_width=5)
-f.line(**line_pos_and_color[1], legend="yr.no", line_dash="dashed", line_dash_offset=5, line_width=5)
-
-
-# ADD PRECIPITATION LABELS
-precipitation_labels_emhi = LabelSet(x="start", y="precipitation_emhi", source=source,
-                                     text="precipitation_emhi", level='glyph', text_font_size="0.5em",
-                                     x_offset=-5, y_offset=5, render_mode='canvas', y_range_name="precip")
-precipitation_labels_yrno = LabelSet(x="start", y="precipitation_yrno", source=source,
-                                     text="precipitation_yrno", level='glyph', text_font_size="0.5em",
-                                     x_offset=-5, y_offset=5, render_mode='canvas', y_range_name="precip")
-f.add_layout(precipitation_labels_emhi)
-f.add_layout(precipitation_labels_yrno)
-
-
-# ADD SYMBOLS (CLOUDINESS ETC), i.e. LABELS
-f.image_url(url="symbol_yrno", x="start", y="temp_yrno", w=None, h=None, anchor="bottom_center", source=source,
-            global_alpha=0.5)
-f.image_url(url="symbol_emhi", x="start", y="temp_emhi", w=None, h=None, anchor="top_center", source=source)
-
-
-# AXIS ETC
-# DATETIME (X) FORMAT
-f.xaxis.formatter = DatetimeTickFormatter(
-    minutes=["%H"], hours=["%H"], days=["%H"], months=["%H"], years=["%H"],
-)
-f.xaxis[0].ticker.desired_num_ticks = 30  # 10 ~ 6h/tick, 30 ~ 2h/tick; 40 ~ h/tick;
-
-# TEMPERATURE (Y1 - LEFT)
-min_temp = np.nanmin(city.union[["temperature_emhi", "temperature_yrno"]])
-max_temp = np.nanmax(city.union[["temperature_emhi", "temperature_yrno"]])
-
-f.y_range = Range1d(start=min_temp - 4, end=max_temp + 4)
-f.yaxis[0].ticker = SingleIntervalTicker(interval=1)
-f.yaxis[0].ticker.num_minor_ticks = 2
-
-# PRECIPITATION (Y2 - RIGHT)
-max_precipitation = np.nanmax(city.union[["precipitation_emhi", "precipitation_yrno"]])  # Ignore "NaN" getting max
-max_precipitation = (int(max_precipitation) + 2) if (int(max_precipitation) + 2) > 4 else 4  # Standardize result
-
-f.extra_y_ranges = {"precip": Range1d(start=0, end=max_precipitation)}
-f.add_layout(LinearAxis(y_range_name="precip"), "right")
-
-# DAY SEPARATORS (MIDNIGHT LINES)
-midnight_time_and_label_dict = midnights.get(source.data["start"])
-for midnight_time, midnight_label in midnight_time_and_label_dict.items():
-    midnight_span = Span(location=midnight_time, dimension='height',
-                         line_color='DimGray', line_width=2, level="underlay")
-    midnight_label = Label(x=midnight_time, y=max_temp + 4, text=midnight_label,
-                           x_offset=5, y_offset=-20, render_mode='canvas', text_font_size="10pt")
-    f.add_layout(midnight_span)  # Add line
-    f.add_layout(midnight_label)  # Add title/label to the line
-
-
-# LEGEND LOCATION
-f.legend.location = "top_left"
-
-
-# DIVS BELOW PLOT (DATA SOURCE + TEXT INPUT BOX)
-css_style = 'style="text-decoration: none;color: DimGray; font-size: calc(7px + .5vw);"'
-weather_notice_text = '<link rel="stylesheet" href="https://code.jquery.com/ui/1.10.4/themes/smoothness/' \
-                      'jquery-ui.min.css" type="text/css">' \
-                      '<a href="{0.yrno_url}" {1}>' \
-                      'Ilmaprognoos Yr-lt, mille on loonud Norra Meteoroloogia Instituut ja NRK</a>' \
-                      '<br>' \
-                      '<a href="{0.emhi_url}" {1}>' \
-                      'Ilmaprognoos Riigi Ilmateenistuselt'.format(city, css_style)
-
-weather_source = Div(text=weather_notice_text)
-
 # CREATE LAYOUT
 plot_layout = layout([
     [f],
@@ -260,5 +133,5 @@ plot_layout = layout([
 )
 
 # PUSH TO SERVER AND ADD TITLE
-curdoc().add_root(plot_layout)
-curdoc().title = "Ilmaennustus"
+doc.add_root(plot_layout)
+doc.title = "Ilmaennustus"
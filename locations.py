@@ -0,0 +1,142 @@
+import bisect
+import csv
+import os
+import unicodedata
+from collections import namedtuple, OrderedDict
+
+LOCATIONS_PATH = os.environ.get("FORECAST_LOCATIONS_PATH",
+                                os.path.join(os.path.dirname(os.path.abspath(__file__)), "locations.csv"))
+SEARCH_LIMIT = 10  # Default amount of matches returned by LocationCatalog.search
+
+# name: str, yrno: str (i.e. "Harjumaa/Tallinn"), emhi: str (i.e. "784"), lat: float, lon: float
+Location = namedtuple("Location", ["name", "yrno", "emhi", "lat", "lon"])
+
+
+def strip_diacritics(text: str) -> str:
+    """
+    Returns text without diacritics, i.e. "Kohtla-Järve" -> "Kohtla-Jarve".
+    :param text: str
+    :return: str
+    """
+    decomposed = unicodedata.normalize("NFKD", text.strip())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def fold(text: str) -> str:
+    """
+    Returns text without diacritics, case and hyphens, i.e. "Pärnu" -> "parnu", "Kohtla-Järve" -> "kohtla jarve".
+    :param text: str
+    :return: str
+    """
+    return " ".join(strip_diacritics(text).casefold().replace("-", " ").split())
+
+
+def get_words(folded_name: str) -> list:
+    """
+    Returns the suffixes of folded_name which start a new word, i.e. "narva joesuu" -> ["joesuu"].
+    :param folded_name: str, see fold
+    :return: list of str
+    """
+    words = []
+    for i, char in enumerate(folded_name):
+        if char == " ":
+            words.append(folded_name[i + 1:])
+    return words
+
+
+class LocationCatalog(object):
+    def __init__(self, locations: list):
+        """
+        Catalog of forecast locations with a sorted (bisect) prefix index of diacritic-folded names, so that a
+        search costs O(log n) plus the amount of matching names, instead of a scan of the whole catalog.
+        :param locations: list of Location; the order is the rank of equally good matches (i.e. by population)
+        """
+        self.locations = OrderedDict((location.name, location) for location in locations)  # name -> Location
+        self._folded = {}  # folded name -> name
+        index = []  # (key, match rank, catalog rank, name); match rank 0 - whole name, 1 - a later word of it
+        for rank, location in enumerate(self.locations.values()):
+            folded_name = fold(location.name)
+            self._folded.setdefault(folded_name, location.name)
+            index.append((folded_name, 0, rank, location.name))
+            index.extend((word, 1, rank, location.name) for word in get_words(folded_name))
+        index.sort()
+        self._keys = [entry[0] for entry in index]  # str, sorted; searched with bisect
+        self._entries = index
+
+    @classmethod
+    def from_csv(cls, path: str = LOCATIONS_PATH) -> "LocationCatalog":
+        """
+        Loads the catalog from a CSV file with columns name, yrno, emhi, lat, lon (UTF-8, with a header).
+        :param path: str
+        :return: LocationCatalog
+        """
+        with open(path, encoding="utf-8", newline="") as csv_file:
+            return cls([Location(row["name"], row["yrno"], row["emhi"], float(row["lat"]), float(row["lon"]))
+                        for row in csv.DictReader(csv_file)])
+
+    def search(self, query: str, limit: int = SEARCH_LIMIT) -> list:
+        """
+        Returns the names of locations, whose name or a word of it starts with query (diacritics and case are
+        ignored). Exact matches come first, then whole name prefixes and then word prefixes, each in catalog order.
+        :param query: str, i.e. "parnu" or "joesuu"
+        :param limit: int
+        :return: list of str, at most limit names
+        """
+        key = fold(query)
+        if not key:
+            return list(self.locations)[:limit]
+        start = bisect.bisect_left(self._keys, key)
+        end = bisect.bisect_left(self._keys, key + "\uffff", lo=start)
+        # All matches of the prefix are ranked; they are few compared to the catalog and shrink as the user types.
+        matches = sorted(self._entries[start:end], key=lambda entry: (entry[0] != key, entry[1], entry[2]))
+        names = OrderedDict()
+        for entry in matches:
+            names.setdefault(entry[3], None)
+            if len(names) == limit:
+                break
+        return list(names)
+
+    def resolve(self, query: str, prefix: bool = True) -> str:
+        """
+        Returns the name of the location query most likely refers to, i.e. "parnu" -> "Pärnu", or None.
+        :param query: str
+        :param prefix: bool; if False, only the whole (folded) name matches, i.e. "parn" -> None
+        :return: str or None
+        """
+        if query in self.locations:
+            return query
+        if not fold(query):
+            return None
+        name = self._folded.get(fold(query))
+        if name is not None or not prefix:
+            return name
+        matches = self.search(query, limit=1)
+        return matches[0] if matches else None
+
+    def get_completions(self) -> list:
+        """
+        Returns the names of all locations (in catalog order) followed by their spellings without diacritics, i.e.
+        "Pärnu", ..., "Parnu". Widgets which filter completions themselves (a case-insensitive substring match,
+        without folding) then also offer a location for text typed without diacritics; the chosen spelling is
+        mapped back to the name with resolve.
+        :return: list of str
+        """
+        names = list(self.locations)
+        aliases = [strip_diacritics(name) for name in names]
+        return names + [alias for alias in aliases if alias not in self.locations]
+
+    def get_city_map(self) -> dict:
+        """
+        :return: dict; name -> {"yrno": ..., "emhi": ...}, i.e. the format of default_data.CITY_MAP
+        """
+        return OrderedDict((name, {"yrno": location.yrno, "emhi": location.emhi})
+                           for name, location in self.locations.items())
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.locations
+
+    def __len__(self) -> int:
+        return len(self.locations)
+
+
+CATALOG = LocationCatalog.from_csv()
@@ -0,0 +1,205 @@
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+# Set FORECAST_METRICS=1 to collect metrics. When disabled, timer() returns a shared no-op context manager and
+# incr()/observe() return right away, so the instrumentation costs about one function call.
+ENABLED = bool(os.environ.get("FORECAST_METRICS"))
+
+logger = logging.getLogger(__name__)
+
+_counters = {}  # (name, labels) -> float
+_summaries = {}  # (name, labels) -> [count, sum, max]
+_lock = threading.Lock()
+
+
+class _NullTimer(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer(object):
+    def __init__(self, name: str, labels: tuple):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        _observe(self.name, self.labels, time.perf_counter() - self.t0)
+        return False
+
+
+def _get_labels(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def timer(name: str, **labels):
+    """
+    Returns a context manager which records the duration of its block (seconds) as summary name.
+    :param name: str, i.e. "parse_seconds"
+    :param labels: str values, i.e. provider="yrno"
+    :return: context manager
+    """
+    if not ENABLED:
+        return _NULL_TIMER
+    return _Timer(name, _get_labels(labels))
+
+
+def incr(name: str, value: float = 1, **labels) -> None:
+    """
+    Increments counter name by value.
+    :param name: str, i.e. "cache_requests"
+    :param value: float
+    :param labels: str values, i.e. city="Tallinn", result="hit"
+    :return: None
+    """
+    if not ENABLED:
+        return
+    key = (name, _get_labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name: str, value: float, **labels) -> None:
+    """
+    Records value (i.e. a payload size) as an observation of summary name.
+    :return: None
+    """
+    if not ENABLED:
+        return
+    _observe(name, _get_labels(labels), value)
+
+
+def _observe(name: str, labels: tuple, value: float) -> None:
+    with _lock:
+        summary = _summaries.get((name, labels))
+        if summary is None:
+            _summaries[(name, labels)] = [1, value, value]
+        else:
+            summary[0] += 1
+            summary[1] += value
+            summary[2] = max(summary[2], value)
+
+
+def _format_key(name: str, labels: tuple) -> str:
+    if not labels:
+        return name
+    return "{}{{{}}}".format(name, ",".join('{}="{}"'.format(label, value) for label, value in labels))
+
+
+def format_text() -> str:
+    """
+    Returns all metrics in Prometheus text format (summaries as _count, _sum and _max).
+    :return: str
+    """
+    with _lock:
+        counters = sorted(_counters.items())
+        summaries = sorted((key, list(summary)) for key, summary in _summaries.items())
+    lines = ["{} {}".format(_format_key(name, labels), value) for (name, labels), value in counters]
+    for (name, labels), (count, total, maximum) in summaries:
+        lines.append("{} {}".format(_format_key(name + "_count", labels), count))
+        lines.append("{} {:.6f}".format(_format_key(name + "_sum", labels), total))
+        lines.append("{} {:.6f}".format(_format_key(name + "_max", labels), maximum))
+    return "\n".join(lines) + "\n"
+
+
+def format_log_line() -> str:
+    """
+    Returns a one-line summary: counters (summed over labels) and mean/max of summaries (summed over labels).
+    :return: str
+    """
+    totals = {}
+    summaries = {}
+    with _lock:
+        for (name, _), value in _counters.items():
+            totals[name] = totals.get(name, 0) + value
+        for (name, _), (count, total, maximum) in _summaries.items():
+            summary = summaries.setdefault(name, [0, 0.0, 0.0])
+            summary[0] += count
+            summary[1] += total
+            summary[2] = max(summary[2], maximum)
+    parts = ["{}={:g}".format(name, value) for name, value in sorted(totals.items())]
+    parts += ["{}=mean:{:.4g},max:{:.4g},n:{}".format(name, total / count, maximum, count)
+              for name, (count, total, maximum) in sorted(summaries.items())]
+    return " ".join(parts)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = format_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def serve(port: int, host: str = "127.0.0.1") -> HTTPServer:
+    """
+    Serves GET /metrics (format_text) in a background thread.
+    :param port: int
+    :param host: str
+    :return: HTTPServer
+    """
+    server = _ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="forecast-metrics", daemon=True).start()
+    return server
+
+
+def log_periodically(interval: float) -> None:
+    """
+    Logs format_log_line every interval seconds in a background thread.
+    :param interval: float, seconds
+    :return: None
+    """
+    def run():
+        while True:
+            time.sleep(interval)
+            logger.info("metrics %s", format_log_line())
+    threading.Thread(target=run, name="forecast-metrics-log", daemon=True).start()
+
+
+_started = False
+_started_lock = threading.Lock()
+
+
+def start_from_env() -> None:
+    """
+    Starts the metrics endpoint (FORECAST_METRICS_PORT) and/or the periodic log line
+    (FORECAST_METRICS_LOG_INTERVAL, seconds) once per process, if metrics are enabled.
+    Safe to call from every Bokeh session.
+    :return: None
+    """
+    global _started
+    if not ENABLED:
+        return
+    with _started_lock:
+        if _started:
+            return
+        _started = True
+        if os.environ.get("FORECAST_METRICS_PORT"):
+            serve(int(os.environ["FORECAST_METRICS_PORT"]))
+        if os.environ.get("FORECAST_METRICS_LOG_INTERVAL"):
+            log_periodically(float(os.environ["FORECAST_METRICS_LOG_INTERVAL"]))
@@ -1,5 +1,8 @@
-from datetime import timedelta
-import time
+import functools
+
+import numpy as np
+
+from solar import TIMEZONE
 
 WEEKDAYS_DICT = {
     1: "Esmaspäev",
@@ -26,20 +29,48 @@ MONTHS_DICT = {
     12: "detsember",
 }
 
-def convert_to_timestamp(input_datetime):
-    add_hours = 0  # TODO: TIMEZONE SUPPORT
-    timezoned_datetime = input_datetime + timedelta(hours=add_hours)
-    return time.mktime(timezoned_datetime.timetuple())*1000
-
-
-def get(input_datetimes):
-    midnight_timestamps = {}
-    for date_time in input_datetimes:
-        if date_time.hour == 0:
-            weekday = WEEKDAYS_DICT[date_time.isoweekday()]
-            day = date_time.day
-            month = MONTHS_DICT[date_time.month]
-            date_text = "{0}, {1}. {2}".format(weekday, day, month)
-            timestamp = convert_to_timestamp(date_time)
-            midnight_timestamps[timestamp] = date_text
-    return midnight_timestamps
+LABEL_CACHE_SIZE = 1024  # Dates; a forecast spans ~10 of them, so this covers years of forecasts
+
+
+@functools.lru_cache(maxsize=LABEL_CACHE_SIZE)
+def get_label(date) -> str:
+    """
+    Returns the day separator label of date, i.e. "Esmaspäev, 5. märts".
+    :param date: datetime.date
+    :return: str
+    """
+    return "{0}, {1}. {2}".format(WEEKDAYS_DICT[date.isoweekday()], date.day, MONTHS_DICT[date.month])
+
+
+def to_local(input_datetimes) -> np.ndarray:
+    """
+    Returns input_datetimes as local (TIMEZONE) wall-clock times. Naive datetimes are already local (forecast times
+    of both providers are), tz-aware ones are converted, i.e. DST is taken into account.
+    :param input_datetimes: pd.Series of dt64 (naive or tz-aware)
+    :return: np.ndarray of datetime64[ns], naive local times
+    """
+    if getattr(input_datetimes.dt, "tz", None) is not None:
+        input_datetimes = input_datetimes.dt.tz_convert(TIMEZONE).dt.tz_localize(None)
+    return input_datetimes.values.astype("datetime64[ns]")
+
+
+def get(input_datetimes) -> dict:
+    """
+    Returns the day separators (local midnights) within the time span of input_datetimes, in one vectorized pass.
+    Separator times are milliseconds of the local wall-clock time, i.e. the same x coordinates as the forecast
+    times of the plot (see forecast_payload.jsonize_values), independent of the server's timezone.
+    :param input_datetimes: pd.Series of dt64 (naive local or tz-aware)
+    :return: dict; "x" -> np.ndarray of float (ms), "text" -> np.ndarray of str; ColumnDataSource data
+    """
+    local_datetimes = to_local(input_datetimes)
+    local_datetimes = local_datetimes[~np.isnat(local_datetimes)]
+    if not len(local_datetimes):
+        return dict(x=np.array([], dtype=np.float64), text=np.array([], dtype=object))
+    # Every midnight in [first, last]; the first one only if the forecast starts exactly at it.
+    first_day = local_datetimes.min().astype("datetime64[D]")
+    first_day += np.timedelta64(int(local_datetimes.min() > first_day), "D")
+    days = np.arange(first_day, local_datetimes.max().astype("datetime64[D]") + np.timedelta64(1, "D"))
+    return dict(
+        x=days.astype("datetime64[ms]").astype(np.float64),
+        text=np.array([get_label(date) for date in days.astype(object)], dtype=object)
+    )
@@ -0,0 +1,103 @@
+import concurrent.futures
+import logging
+import os
+import random
+import threading
+import time
+from collections import namedtuple
+
+import forecast_cache
+from default_data import CITY_MAP
+
+PREFETCH_MIN_INTERVAL = 600  # Seconds; yr.no terms of use do not allow refreshing more often than every 10 min.
+PREFETCH_MAX_WORKERS = 4  # Amount of cities fetched at the same time.
+PREFETCH_JITTER = 30  # Seconds; the start of each city is delayed randomly by up to this amount within a round.
+
+logger = logging.getLogger(__name__)
+
+RefreshTiming = namedtuple("RefreshTiming", ["started", "duration", "error"])  # float (epoch), float (s), Exception
+
+
+class Prefetcher(object):
+    """
+    Refreshes every city in the process-wide forecast cache on a fixed interval in a background thread, so that
+    user requests are served from the cache instead of waiting on upstream.
+    """
+    def __init__(self, interval: float, cities: list = None, max_workers: int = PREFETCH_MAX_WORKERS,
+                 jitter: float = PREFETCH_JITTER, cache: forecast_cache.ForecastCache = None):
+        if interval < PREFETCH_MIN_INTERVAL:
+            raise ValueError("Prefetch interval must be at least {} seconds".format(PREFETCH_MIN_INTERVAL))
+        self.interval = interval  # float, seconds
+        self.cities = list(cities or CITY_MAP)  # list of str
+        self.max_workers = max_workers  # int
+        self.jitter = jitter  # float, seconds
+        self.cache = cache or forecast_cache.get_cache()  # ForecastCache
+        self.timings = {}  # city name -> RefreshTiming of the latest refresh
+        self.last_round = None  # RefreshTiming of the latest round (error is always None)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="forecast-prefetch", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            round_started = time.monotonic()
+            self.run_once()
+            self._stop.wait(max(0.0, self.interval - (time.monotonic() - round_started)))
+
+    def run_once(self) -> None:
+        """
+        Refreshes all cities once, at most .max_workers at a time. The jittered start times are scheduled here
+        (cities are submitted when their time comes), so that the workers are busy only with fetching.
+        :return: None
+        """
+        started = time.time()
+        t0 = time.perf_counter()
+        schedule = sorted((random.uniform(0, self.jitter), city) for city in self.cities)  # (delay, city)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for delay, city in schedule:
+                if self._stop.wait(max(0.0, delay - (time.perf_counter() - t0))):
+                    break
+                pool.submit(self._refresh, city)
+        self.last_round = RefreshTiming(started, time.perf_counter() - t0, None)
+        logger.info("Prefetched %d cities in %.1f s", len(self.cities), self.last_round.duration)
+
+    def _refresh(self, city: str) -> None:
+        if self._stop.is_set():
+            return
+        started = time.time()
+        t0 = time.perf_counter()
+        error = None
+        try:
+            self.cache.refresh(city)
+        except Exception as exc:
+            error = exc
+        self.timings[city] = RefreshTiming(started, time.perf_counter() - t0, error)
+
+
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+
+def start_from_env() -> Prefetcher:
+    """
+    Starts the process-wide prefetcher once, if FORECAST_PREFETCH_INTERVAL (seconds) is set.
+    Safe to call from every Bokeh session.
+    :return: Prefetcher or None (prefetching disabled)
+    """
+    global _prefetcher
+    interval = os.environ.get("FORECAST_PREFETCH_INTERVAL")
+    if not interval:
+        return None
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = Prefetcher(float(interval))
+            _prefetcher.start()
+    return _prefetcher
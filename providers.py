@@ -0,0 +1,93 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+POOL_MAXSIZE = 16  # Keep-alive connections per host; should be >= the amount of concurrent fetches.
+# Bytes; the deadline of a request is checked after each chunk of the body. A read waits for a whole chunk, so a
+# small one bounds how late a slow sender is cut off.
+READ_CHUNK_SIZE = 1024
+
+
+class ProviderClient(object):
+    """
+    HTTP client for forecast providers: pooled keep-alive connections (one requests.Session shared by all
+    threads) and conditional requests (ETag/Last-Modified revalidation). Counts requests and bytes saved, also as
+    metrics (provider_<counter>, see metrics.py).
+    """
+    def __init__(self, pool_maxsize: int = POOL_MAXSIZE):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.counters = {
+            "requests": 0,  # All requests
+            "not_modified": 0,  # 304 responses, i.e. downloads and parses saved
+            "bytes_received": 0,  # Response body bytes
+            "bytes_saved": 0,  # Body bytes of the last full response for URLs that answered 304
+        }
+        self._body_sizes = {}  # URL -> int, body size of the last full response
+        self._lock = threading.Lock()
+
+    def get(self, url: str, timeout: float, validators: dict = None, deadline: float = None) -> requests.Response:
+        """
+        Sends a (conditional) GET request. Raises requests.RequestException on failure, timeout or error status.
+        :param url: str
+        :param timeout: float, seconds; for connecting and for each read (see requests)
+        :param validators: dict or None; {"etag": str or None, "last_modified": str or None} of the response whose
+                           parsed result the caller still holds, see get_validators
+        :param deadline: float or None; time.monotonic() by which the whole body must have arrived. A slower response
+                         is aborted (its connection is closed) with requests.Timeout, at most about one
+                         READ_CHUNK_SIZE late, so that a slow sender does not keep the calling thread busy.
+        :return: requests.Response with the body read; status_code 304 means that the caller's earlier result is
+                 still valid
+        """
+        headers = {}
+        if validators:
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("last_modified"):
+                headers["If-Modified-Since"] = validators["last_modified"]
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise requests.Timeout("No time left for {}".format(url))
+            timeout = min(timeout, remaining)
+        response = self.session.get(url, timeout=timeout, headers=headers, stream=True)
+        try:
+            response.raise_for_status()
+            chunks = []
+            for chunk in response.iter_content(READ_CHUNK_SIZE):
+                chunks.append(chunk)
+                if deadline is not None and time.monotonic() > deadline:
+                    raise requests.Timeout("Response of {} did not arrive by the deadline".format(url))
+            response._content = b"".join(chunks)  # As if read without stream, i.e. for .content and .text
+        finally:
+            response.close()  # Releases a fully read connection to the pool; closes an aborted one
+        with self._lock:
+            if response.status_code == 304:
+                counts = {"requests": 1, "not_modified": 1, "bytes_saved": self._body_sizes.get(url, 0)}
+            else:
+                counts = {"requests": 1, "bytes_received": len(response.content)}
+                self._body_sizes[url] = len(response.content)
+            for counter, value in counts.items():
+                self.counters[counter] += value
+        for counter, value in counts.items():
+            metrics.incr("provider_" + counter, value)
+        return response
+
+    @staticmethod
+    def get_validators(response: requests.Response) -> dict:
+        """
+        Returns the validators of response, to be passed to get on the next request of the same URL.
+        :param response: requests.Response
+        :return: {"etag": str or None, "last_modified": str or None}
+        """
+        return {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
+
+
+# Shared by all City objects of the process.
+CLIENT = ProviderClient()
@@ -0,0 +1,91 @@
+"""
+Sunrise and sunset times computed locally (sunrise equation, accurate to about a minute), so that day/night symbols
+don't depend on a provider and are correct for every day of a multi-day forecast.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+TIMEZONE = "Europe/Tallinn"  # Forecast times of both providers are local times
+SUN_ALTITUDE = -0.833  # Degrees; sunrise/sunset = upper limb on the horizon (with atmospheric refraction)
+AXIAL_TILT = 23.4397  # Degrees
+J2000 = 2451545.0  # Julian date of 2000-01-01 12:00 UTC
+UNIX_EPOCH_JD = 2440587.5  # Julian date of 1970-01-01 00:00 UTC
+SUN_CACHE_MAX_SIZE = 100000  # (location, day) pairs; the cache is cleared when it grows larger
+
+_cache = {}  # (lat, lon, np.datetime64 day) -> (sunrise, sunset) as seconds since local midnight
+_cache_lock = threading.Lock()
+
+
+def compute_sun_times(lat: float, lon: float, days: np.ndarray) -> tuple:
+    """
+    Returns sunrise and sunset of days in one vectorized pass. During polar day (night) sunrise and sunset
+    are 12 hours before and after (equal to) the solar noon.
+    :param lat: float, degrees north
+    :param lon: float, degrees east
+    :param days: np.ndarray of datetime64[D], local dates
+    :return: (np.ndarray, np.ndarray) of datetime64[s], local (naive) sunrise and sunset times
+    """
+    n = days.astype("datetime64[D]").astype(np.int64) - (J2000 - UNIX_EPOCH_JD - 0.5)  # Days since J2000 (noon)
+    mean_solar_noon = n - lon / 360
+    anomaly = np.radians((357.5291 + 0.98560028 * mean_solar_noon) % 360)
+    center = 1.9148 * np.sin(anomaly) + 0.02 * np.sin(2 * anomaly) + 0.0003 * np.sin(3 * anomaly)
+    ecliptic_longitude = np.radians((np.degrees(anomaly) + center + 180 + 102.9372) % 360)
+    transit = J2000 + mean_solar_noon + 0.0053 * np.sin(anomaly) - 0.0069 * np.sin(2 * ecliptic_longitude)
+    declination = np.arcsin(np.sin(ecliptic_longitude) * np.sin(np.radians(AXIAL_TILT)))
+    latitude = np.radians(lat)
+    cos_hour_angle = ((np.sin(np.radians(SUN_ALTITUDE)) - np.sin(latitude) * np.sin(declination))
+                      / (np.cos(latitude) * np.cos(declination)))
+    hour_angle = np.degrees(np.arccos(np.clip(cos_hour_angle, -1, 1)))
+
+    def to_local(julian_dates: np.ndarray) -> np.ndarray:
+        utc = pd.to_datetime((julian_dates - UNIX_EPOCH_JD) * 86400, unit="s", utc=True)
+        return utc.tz_convert(TIMEZONE).tz_localize(None).values.astype("datetime64[s]")
+
+    return to_local(transit - hour_angle / 360), to_local(transit + hour_angle / 360)
+
+
+def get_sun_seconds(lat: float, lon: float, days: np.ndarray) -> tuple:
+    """
+    Returns sunrise and sunset of days as seconds since local midnight; computed once per location and day.
+    :param lat: float, degrees north
+    :param lon: float, degrees east
+    :param days: np.ndarray of datetime64[D], local dates (may repeat)
+    :return: (np.ndarray, np.ndarray) of int, aligned with days
+    """
+    unique_days, inverse = np.unique(days, return_inverse=True)
+    with _cache_lock:
+        times = {day: _cache.get((lat, lon, day)) for day in unique_days}  # day -> (sunrise, sunset) or None
+    missing = np.array([day for day, sun in times.items() if sun is None], dtype="datetime64[D]")
+    if len(missing):
+        sunrises, sunsets = compute_sun_times(lat, lon, missing)
+        rise_seconds = (sunrises - sunrises.astype("datetime64[D]")).astype(np.int64)
+        set_seconds = (sunsets - sunsets.astype("datetime64[D]")).astype(np.int64)
+        computed = {day: (int(rise), int(set_)) for day, rise, set_ in zip(missing, rise_seconds, set_seconds)}
+        times.update(computed)
+        with _cache_lock:
+            if len(_cache) > SUN_CACHE_MAX_SIZE:
+                _cache.clear()
+            _cache.update(((lat, lon, day), sun) for day, sun in computed.items())
+    sun_seconds = np.array([times[day] for day in unique_days], dtype=np.int64).reshape(-1, 2)
+    return sun_seconds[inverse, 0], sun_seconds[inverse, 1]
+
+
+def is_daytime(lat: float, lon: float, datetimes: pd.Series) -> pd.Series:
+    """
+    Returns if datetimes (local) are between the sunrise and sunset of their own day.
+    :param lat: float, degrees north
+    :param lon: float, degrees east
+    :param datetimes: pd.Series of dt64
+    :return: pd.Series of bool; False for NaT
+    """
+    values = datetimes.values.astype("datetime64[s]")
+    valid = ~np.isnat(values)
+    days = values[valid].astype("datetime64[D]")
+    result = np.zeros(len(values), dtype=bool)
+    if len(days):
+        seconds = (values[valid] - days).astype(np.int64)
+        sunrise, sunset = get_sun_seconds(lat, lon, days)
+        result[valid] = (sunrise <= seconds) & (seconds <= sunset)
+    return pd.Series(result, index=datetimes.index)
@@ -0,0 +1,56 @@
+"""
+Tests of the time stamps sent by forecast_api: forecast times are local (Europe/Tallinn) wall-clock times.
+"""
+import json
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+import forecast_api
+from forecast_data import City, FORECAST_COLUMNS
+
+# Naive local start times around the summer time changes of 2018 and their UTC instants
+STARTS = ["2018-03-25T02:00:00", "2018-03-25T04:00:00", "2018-07-01T12:00:00", "2018-10-28T02:00:00",
+          "2018-10-28T03:00:00", "2018-10-28T04:00:00"]
+UTC_STARTS = ["2018-03-25T00:00:00", "2018-03-25T01:00:00", "2018-07-01T09:00:00", "2018-10-27T23:00:00",
+              "2018-10-28T00:00:00", "2018-10-28T02:00:00"]
+
+
+@pytest.fixture
+def city() -> City:
+    rows = {
+        "start": STARTS,
+        "end": STARTS[1:] + ["2018-10-28T05:00:00"],
+        "temperature": [1.0] * len(STARTS),
+        "symbol": ["01d"] * len(STARTS),
+    }
+    yrno = City.convert_df_dtypes(pd.DataFrame(rows, columns=FORECAST_COLUMNS))
+    return City.from_frames("Tallinn", yrno, City._empty_df(), datetime(2018, 3, 25, 6), datetime(2018, 3, 25, 19),
+                            0.0)
+
+
+def test_localize_ambiguous_and_nonexistent():
+    series = pd.Series(pd.to_datetime(["2018-10-28 03:00", "2018-10-28 03:00", "2018-03-25 03:30", None]))
+    result = forecast_api.localize(series).dt.tz_convert("UTC")
+    assert result.iloc[0] == pd.Timestamp("2018-10-28 00:00", tz="UTC")  # Summer time
+    assert result.iloc[1] == pd.Timestamp("2018-10-28 01:00", tz="UTC")  # The repeated hour, winter time
+    assert result.iloc[2] == pd.Timestamp("2018-03-25 01:00", tz="UTC")  # Skipped, moved to 04:00
+    assert pd.isnull(result.iloc[3])
+
+
+def test_json_sends_utc_epoch_milliseconds(city):
+    forecast = json.loads(forecast_api.encode_json([city]).decode("utf-8"))["forecasts"][0]
+    expected = [pd.Timestamp(start, tz="UTC").value // 10 ** 6 for start in UTC_STARTS]
+    assert forecast["columns"]["start"] == expected
+
+
+def test_arrow_timestamps_have_time_zone(city):
+    pyarrow = pytest.importorskip("pyarrow")
+    table = pyarrow.ipc.open_stream(forecast_api.encode_arrow([city])).read_all()
+    assert table.schema.field("start").type.tz == "Europe/Tallinn"
+    assert table.schema.field("end").type.tz == "Europe/Tallinn"
+    starts = table.column("start").to_pandas()
+    assert starts.dt.tz_convert("UTC").dt.tz_localize(None).tolist() == \
+        [pd.Timestamp(start) for start in UTC_STARTS]
+    assert starts.dt.tz_localize(None).tolist() == [pd.Timestamp(start) for start in STARTS]
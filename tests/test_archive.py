@@ -0,0 +1,74 @@
+"""
+Tests of ForecastArchive: partitions by issue date and provider, files rolled over by size and on flush.
+"""
+import os
+from datetime import datetime, timezone
+
+import pandas as pd
+import pytest
+
+from benchmarks import fixtures
+from forecast_data import City
+
+pytest.importorskip("pyarrow")
+import forecast_archive  # noqa: E402 (needs pyarrow)
+
+ISSUED_AT = datetime(2018, 3, 24, 12, tzinfo=timezone.utc).timestamp()
+
+
+def make_city(name: str, fetched_at: float) -> City:
+    city = City(name)
+    yrno = city.parse_yrno(fixtures.synthetic_yrno(name))
+    emhi = city.parse_emhi(fixtures.synthetic_emhi(name))
+    return City.from_frames(name, yrno, emhi, datetime(2018, 3, 24, 6), datetime(2018, 3, 24, 19), fetched_at)
+
+
+def get_files(root: str) -> list:
+    return sorted(os.path.relpath(os.path.join(path, name), root)
+                  for path, _, names in os.walk(root) for name in names)
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = forecast_archive.ForecastArchive(str(tmp_path), rollover_interval=3600)
+    yield archive
+    archive.close()
+
+
+def test_one_file_per_provider_and_date(archive, tmp_path):
+    for i, name in enumerate(["Tallinn", "Tartu", "Pärnu"] * 2):
+        archive.append(make_city(name, ISSUED_AT + i * 600))
+    assert get_files(str(tmp_path)) == []  # Buffered
+    archive.flush()
+    files = get_files(str(tmp_path))
+    assert [os.path.dirname(path) for path in files] == [os.path.join("date=2018-03-24", "provider=emhi"),
+                                                          os.path.join("date=2018-03-24", "provider=yrno")]
+
+
+def test_query(archive):
+    tallinn = make_city("Tallinn", ISSUED_AT)
+    for city in [tallinn, make_city("Tartu", ISSUED_AT), make_city("Tallinn", ISSUED_AT + 600)]:
+        archive.append(city)
+    archive.flush()
+    result = archive.query("Tallinn", "yrno", ISSUED_AT, ISSUED_AT + 3600)
+    assert "city" not in result.columns
+    assert len(result) == 2 * len(tallinn.yrno)
+    assert result["issued_at"].nunique() == 2
+    first = result[result["issued_at"] == result["issued_at"].min()].reset_index(drop=True)
+    pd.testing.assert_series_equal(first["temperature"], tallinn.yrno["temperature"].reset_index(drop=True),
+                                   check_names=False)
+    assert len(archive.query("Tallinn", "yrno", ISSUED_AT + 60, ISSUED_AT + 3600)) == len(tallinn.yrno)
+    assert archive.query("Narva", "yrno", ISSUED_AT, ISSUED_AT + 3600).empty
+
+
+def test_rollover_by_rows(tmp_path):
+    city = make_city("Tallinn", ISSUED_AT)
+    archive = forecast_archive.ForecastArchive(str(tmp_path), file_rows=2 * len(city.yrno), rollover_interval=3600)
+    try:
+        for i in range(4):
+            archive.append(make_city("Tallinn", ISSUED_AT + i * 600))
+        archive._queue.join()  # Queued forecasts are buffered, full buffers are written
+        yrno_files = [path for path in get_files(str(tmp_path)) if "provider=yrno" in path]
+        assert len(yrno_files) == 2
+    finally:
+        archive.close()
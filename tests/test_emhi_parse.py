@@ -0,0 +1,105 @@
+"""
+Regression test of the column-wise emhi parser (City.parse_emhi) against the former row-wise implementation, with
+day and night checked independently of City._is_daytime.
+"""
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import solar
+from default_data import ELEMENTS_MAP
+from forecast_data import City, FORECAST_COLUMNS
+from locations import CATALOG
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "emhi_tallinn.jsonp")
+# Symbols of the fixture. In Tallinn (24.75 E, 59.44 N) the solar noon is at about 12:27 winter time and the days
+# are about 12.5 hours long in late March, i.e. sunrise about 06:10 and sunset about 18:45 (an hour later in summer
+# time, from 2018-03-25 03:00): 18:00 is day, 21:00, 00:00 and 06:00 are night.
+EXPECTED_SYMBOLS = {
+    "2018-03-24T15:00": "01d", "2018-03-24T18:00": "02d", "2018-03-24T21:00": "03n", "2018-03-25T00:00": "03n",
+    "2018-03-25T03:00": "04", "2018-03-25T06:00": "40n", "2018-03-25T09:00": "05d", "2018-03-25T12:00": "41d",
+    "2018-03-25T15:00": "46", "2018-03-25T18:00": "09", "2018-03-25T21:00": "10", "2018-03-26T00:00": "22",
+    "2018-03-26T03:00": "11", "2018-03-26T06:00": "42n",
+}
+
+
+def is_daytime_rowwise(city: City, start: datetime) -> bool:
+    """
+    Day/night of one start time from the sun times of its own day, i.e. without the vectorized, cached
+    solar.is_daytime used by City._is_daytime.
+    """
+    location = CATALOG.locations[city.name]
+    sunrise, sunset = solar.compute_sun_times(location.lat, location.lon, np.array([start], dtype="datetime64[D]"))
+    return sunrise[0] <= np.datetime64(start, "s") <= sunset[0]
+
+
+def parse_emhi_rowwise(city: City, emhi_data: str) -> pd.DataFrame:
+    """
+    The former implementation: one dict per hour, symbols converted with DataFrame.apply row by row.
+    Missing, empty and unknown phenomens are NaN (the former code raised KeyError for missing and unknown ones).
+    The former code compared the hours with the yr.no sun times of the first day; here each row uses its own day.
+    """
+    emhi_data = emhi_data.replace("callback(", "").replace(");", "")
+    emhi_json = json.loads(emhi_data)["forecast"]["tabular"]["time"]
+    data = []
+    for hour in emhi_json:
+        hour_data = {"start": hour["@attributes"]["from"], "end": hour["@attributes"]["to"]}
+        for element in hour:
+            if element in ELEMENTS_MAP["emhi"]:
+                hour_data[element] = hour[element]["@attributes"][ELEMENTS_MAP["emhi"][element]]
+        data.append(hour_data)
+    df = pd.DataFrame(data)
+    df = df.rename(columns={'phenomen': 'symbol'})
+    df = City.convert_df_dtypes(df)
+
+    def convert_emhi_symbol(row):
+        if isinstance(row.symbol, str) and row.symbol in ELEMENTS_MAP["emhi_symbols"]:
+            symbol = ELEMENTS_MAP["emhi_symbols"][row.symbol]
+            if "d" in symbol and not is_daytime_rowwise(city, row.start.to_pydatetime()):
+                symbol = symbol.replace("d", "n")
+            return symbol
+        return np.nan
+
+    df['symbol'] = df.apply(convert_emhi_symbol, axis=1)
+    return df[FORECAST_COLUMNS]
+
+
+@pytest.fixture(scope="module")
+def emhi_data() -> str:
+    with open(FIXTURE_PATH, encoding="utf-8") as fixture:
+        return fixture.read()
+
+
+def test_parse_emhi_matches_rowwise(emhi_data):
+    city = City("Tallinn")
+    expected = parse_emhi_rowwise(city, emhi_data)
+    result = city.parse_emhi(emhi_data)
+    pd.testing.assert_frame_equal(result[FORECAST_COLUMNS].reset_index(drop=True), expected, check_dtype=False)
+
+
+def test_parse_emhi_symbols(emhi_data):
+    symbols = City("Tallinn").parse_emhi(emhi_data)["symbol"]
+    assert pd.isnull(symbols.iloc[7])  # Unknown phenomen
+    assert pd.isnull(symbols.iloc[11])  # Missing phenomen
+    assert pd.isnull(symbols.iloc[1])  # Empty phenomen
+    assert symbols.iloc[0] == "01d"  # "clear" at 15:00
+    assert symbols.iloc[9] == "03n"  # "cloudy_with_clear_spells" at midnight
+    assert symbols.notnull().sum() == 14  # Every third hour
+
+
+def test_parse_emhi_night_symbols(emhi_data):
+    df = City("Tallinn").parse_emhi(emhi_data)
+    symbols = {start.strftime("%Y-%m-%dT%H:%M"): symbol for start, symbol in zip(df["start"], df["symbol"])
+               if pd.notnull(symbol)}
+    assert symbols == EXPECTED_SYMBOLS
+
+
+def test_parse_emhi_normalizes_city_name(emhi_data):
+    symbols = City("tallinn").parse_emhi(emhi_data)["symbol"]
+    assert symbols.iloc[9] == "03n"
+    with pytest.raises(KeyError):  # No coordinates, no day/night; not silently daytime symbols
+        City("Atlantis").parse_emhi(emhi_data)
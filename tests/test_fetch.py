@@ -0,0 +1,200 @@
+"""
+Tests of City.fetch_forecasts against a local stand-in for the providers: concurrency, partial results, the
+total fetch deadline and conditional requests (304 Not Modified).
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+import pandas as pd
+import pytest
+
+import forecast_data
+import metrics
+import providers
+from benchmarks import fixtures
+from forecast_data import City
+
+LATENCY = 0.5  # Seconds per provider response
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Serves GET /<provider>/<code> as configured in .server.behaviour[provider]:
+    {"delay": seconds, "status": int, "drip": seconds between body chunks (slow sender),
+     "etag": str (sent with the body; a matching If-None-Match is answered with 304)}
+    Counts the responses per provider and status in .server.responses.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        provider = self.path.strip("/").split("/")[0]
+        behaviour = self.server.behaviour[provider]
+        time.sleep(behaviour.get("delay", 0))
+        status = behaviour.get("status", 200)
+        etag = behaviour.get("etag")
+        body = fixtures.synthetic_yrno("Tallinn") if provider == "yrno" else \
+            fixtures.synthetic_emhi("Tallinn").encode("utf-8")
+        if status == 200 and etag and self.headers.get("If-None-Match") == etag:
+            status, body = 304, b""
+        elif status != 200:
+            body = b"error"
+        key = (provider, status)
+        self.server.responses[key] = self.server.responses.get(key, 0) + 1
+        self.send_response(status)
+        if etag and status in (200, 304):
+            self.send_header("ETag", etag)
+        if status != 304:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        drip = behaviour.get("drip")
+        try:
+            if drip:
+                for i in range(0, len(body), 1024):
+                    self.wfile.write(body[i:i + 1024])
+                    self.wfile.flush()
+                    time.sleep(drip)
+            else:
+                self.wfile.write(body)
+        except OSError:  # The client gave up
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture
+def stand_in(monkeypatch):
+    server = StandInServer(("127.0.0.1", 0), StandInHandler)
+    server.behaviour = {"yrno": {}, "emhi": {}}
+    server.responses = {}  # (provider, status) -> int
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = "http://127.0.0.1:{}".format(server.server_address[1])
+    monkeypatch.setattr(forecast_data, "YRNO_QUERY_URL", base + "/yrno/{}")
+    monkeypatch.setattr(forecast_data, "EMHI_QUERY_URL", base + "/emhi/{}")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_providers_are_fetched_concurrently(stand_in):
+    stand_in.behaviour = {"yrno": {"delay": LATENCY}, "emhi": {"delay": LATENCY}}
+    t0 = time.perf_counter()
+    city = City("Tallinn").load()
+    elapsed = time.perf_counter() - t0
+    assert not city.errors
+    assert len(city.yrno) and len(city.emhi) and len(city.union)
+    assert elapsed < 1.8 * LATENCY  # Sequential fetches would take 2 * LATENCY
+
+
+def test_failed_provider_gives_partial_result(stand_in):
+    stand_in.behaviour = {"yrno": {"delay": LATENCY}, "emhi": {"status": 500}}
+    city = City("Tallinn").load()
+    assert set(city.errors) == {"emhi"}
+    assert city.emhi.empty
+    assert len(city.yrno) == len(city.union)
+    assert city.union["temperature_emhi"].isnull().all()
+
+
+def test_failed_provider_keeps_previous_forecast(stand_in):
+    previous = City("Tallinn").load()
+    stand_in.behaviour = {"yrno": {}, "emhi": {"status": 503}}
+    city = City("Tallinn", previous=previous).load()
+    assert set(city.errors) == {"emhi"}
+    assert city.emhi is previous.emhi
+
+
+def test_slow_sender_is_cut_at_fetch_deadline(stand_in, monkeypatch):
+    monkeypatch.setattr(forecast_data, "FETCH_DEADLINE", 1.0)
+    # Every read arrives well within the requests timeout, but the whole body takes far longer than the deadline
+    stand_in.behaviour = {"yrno": {"drip": 0.2}, "emhi": {}}
+    t0 = time.perf_counter()
+    city = City("Tallinn").load()
+    elapsed = time.perf_counter() - t0
+    assert elapsed < 2.0
+    assert set(city.errors) == {"yrno"}
+    assert city.yrno.empty and len(city.emhi)
+    assert "yrno" not in city.validators  # The late response must not change the City
+
+
+def test_slow_sender_releases_worker_at_fetch_deadline(stand_in, monkeypatch):
+    monkeypatch.setattr(forecast_data, "FETCH_DEADLINE", 1.0)
+    stand_in.behaviour = {"yrno": {"drip": 0.5}, "emhi": {}}  # 2 KiB/s; the whole body takes about 8 s
+    request = City._request
+    finished = {}
+
+    def timed_request(self, forecast_provider, previous=None, deadline=None):
+        try:
+            return request(self, forecast_provider, previous, deadline)
+        finally:
+            finished[forecast_provider] = time.perf_counter()
+    monkeypatch.setattr(City, "_request", timed_request)
+    t0 = time.perf_counter()
+    City("Tallinn").load()
+    for _ in range(50):
+        if "yrno" in finished:
+            break
+        time.sleep(0.1)
+    assert finished["yrno"] - t0 < 2.5  # Aborted about one read chunk after the deadline, not at the end of the body
+
+
+def test_unknown_city_is_not_a_provider_error(stand_in):
+    with pytest.raises(KeyError):
+        City("Atlantis").load()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """
+    A new ProviderClient (own counters), as used by forecast_data.
+    """
+    client = providers.ProviderClient()
+    monkeypatch.setattr(forecast_data, "CLIENT", client)
+    return client
+
+
+def test_not_modified_reuses_previous_forecast(stand_in, client):
+    stand_in.behaviour = {"yrno": {"etag": '"y1"'}, "emhi": {"etag": '"e1"'}}
+    previous = City("Tallinn").load()
+    assert previous.validators["yrno"]["etag"] == '"y1"'
+    city = City("Tallinn", previous=previous).load()
+    assert stand_in.responses == {("yrno", 200): 1, ("emhi", 200): 1, ("yrno", 304): 1, ("emhi", 304): 1}
+    assert not city.errors
+    assert city.yrno is previous.yrno and city.emhi is previous.emhi
+    assert city.union is previous.union  # Not merged again
+    assert city.version == previous.version
+    assert (city.sunrise, city.sunset) == (previous.sunrise, previous.sunset)
+    assert city.validators == previous.validators
+    body_sizes = len(fixtures.synthetic_yrno("Tallinn")) + len(fixtures.synthetic_emhi("Tallinn").encode("utf-8"))
+    assert client.counters == {"requests": 4, "not_modified": 2, "bytes_received": body_sizes,
+                               "bytes_saved": body_sizes}
+
+
+def test_changed_provider_is_parsed_again(stand_in, client):
+    stand_in.behaviour = {"yrno": {"etag": '"y1"'}, "emhi": {"etag": '"e1"'}}
+    previous = City("Tallinn").load()
+    stand_in.behaviour["emhi"]["etag"] = '"e2"'  # A new emhi forecast
+    city = City("Tallinn", previous=previous).load()
+    assert city.yrno is previous.yrno
+    assert city.emhi is not previous.emhi
+    pd.testing.assert_frame_equal(city.emhi, previous.emhi)
+    assert city.union is not previous.union
+    assert city.validators["emhi"]["etag"] == '"e2"'
+    assert client.counters["not_modified"] == 1
+
+
+def test_provider_counters_are_exported(stand_in, client, monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    monkeypatch.setattr(metrics, "_counters", {})
+    monkeypatch.setattr(metrics, "_summaries", {})
+    stand_in.behaviour = {"yrno": {"etag": '"y1"'}, "emhi": {}}
+    City("Tallinn", previous=City("Tallinn").load()).load()
+    lines = metrics.format_text().splitlines()
+    assert "provider_requests 4" in lines
+    assert "provider_not_modified 1" in lines
+    assert "provider_bytes_saved {}".format(len(fixtures.synthetic_yrno("Tallinn"))) in lines
@@ -0,0 +1,81 @@
+"""
+Tests of LocationCatalog.search, resolve and get_completions (diacritics, case, hyphens and word prefixes).
+"""
+import pytest
+
+from locations import CATALOG, Location, LocationCatalog, fold
+
+
+@pytest.fixture
+def catalog() -> LocationCatalog:
+    names = ["Tallinn", "Tartu", "Narva", "Pärnu", "Kohtla-Järve", "Narva-Jõesuu", "Tõrva"]
+    return LocationCatalog([Location(name, "", "", 0.0, 0.0) for name in names])
+
+
+def browser_filter(completions: list, text: str) -> list:
+    """
+    The filter of Bokeh's AutocompleteInput with case_sensitive=False and search_strategy="includes".
+    """
+    return [completion for completion in completions if text.lower() in completion.lower()]
+
+
+def test_fold():
+    assert fold(" Kohtla-Järve ") == "kohtla jarve"
+    assert fold("NARVA-JÕESUU") == "narva joesuu"
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("parnu", ["Pärnu"]),
+    ("PÄR", ["Pärnu"]),
+    ("joesuu", ["Narva-Jõesuu"]),
+    ("jarve", ["Kohtla-Järve"]),
+    ("ta", ["Tallinn", "Tartu"]),  # Catalog order
+    ("narva", ["Narva", "Narva-Jõesuu"]),  # Exact match first
+    ("t", ["Tallinn", "Tartu", "Tõrva"]),
+    ("xyz", []),
+])
+def test_search(catalog, query, expected):
+    assert catalog.search(query) == expected
+
+
+def test_search_limit(catalog):
+    assert catalog.search("", 2) == ["Tallinn", "Tartu"]
+    assert catalog.search("t", 1) == ["Tallinn"]
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("Pärnu", "Pärnu"),
+    ("parnu", "Pärnu"),
+    ("kohtla jarve", "Kohtla-Järve"),
+    ("Narva-Joesuu", "Narva-Jõesuu"),
+    ("tart", "Tartu"),
+    ("  ", None),
+    ("xyz", None),
+])
+def test_resolve(catalog, query, expected):
+    assert catalog.resolve(query) == expected
+
+
+def test_resolve_whole_name(catalog):
+    assert catalog.resolve("tart", prefix=False) is None
+    assert catalog.resolve("torva", prefix=False) == "Tõrva"
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("parnu", "Pärnu"),
+    ("tallinn", "Tallinn"),
+    ("joesuu", "Narva-Jõesuu"),
+    ("JÄRVE", "Kohtla-Järve"),
+])
+def test_completions_match_browser_filter(catalog, text, expected):
+    completions = catalog.get_completions()
+    shown = browser_filter(completions, text)
+    assert shown
+    assert {catalog.resolve(completion) for completion in shown} == {expected}
+
+
+def test_completions_resolve_to_catalog():
+    completions = CATALOG.get_completions()
+    assert completions[:len(CATALOG)] == list(CATALOG.locations)
+    assert len(set(completions)) == len(completions)
+    assert all(CATALOG.resolve(completion, prefix=False) in CATALOG for completion in completions)
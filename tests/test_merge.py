@@ -0,0 +1,93 @@
+"""
+Tests of forecast_merge.align and resample with providers of mixed time resolution.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import forecast_batch
+import forecast_merge
+from forecast_data import City, FORECAST_COLUMNS
+
+
+def make_frame(intervals: list, temperatures: list, precipitations: list, symbols: list) -> pd.DataFrame:
+    rows = {
+        "start": [start for start, _ in intervals],
+        "end": [end for _, end in intervals],
+        "temperature": temperatures,
+        "precipitation": precipitations,
+        "pressure": [1000.0] * len(intervals),
+        "windDirection": [180.0] * len(intervals),
+        "windSpeed": [3.0] * len(intervals),
+        "symbol": symbols,
+    }
+    return City.convert_df_dtypes(pd.DataFrame(rows, columns=FORECAST_COLUMNS))
+
+
+def get_hours(first: int, last: int, step: int = 1) -> list:
+    return [("2018-03-25T{:02d}:00:00".format(hour), "2018-03-25T{:02d}:00:00".format(hour + step))
+            for hour in range(first, last, step)]
+
+
+@pytest.fixture
+def frames() -> dict:
+    yrno = make_frame(get_hours(0, 12), [float(hour) for hour in range(12)], [0.1] * 12, ["01d"] * 12)
+    # Hourly until 06:00, then one 6-hour row (as ilmateenistus does for later hours)
+    emhi = make_frame(get_hours(0, 6) + get_hours(6, 12, 6), [-1.0, -2.0, -3.0, -4.0, -5.0, -6.0, -7.0],
+                      [0.0, 0.0, 0.5, 0.0, 0.0, 0.0, 3.0], ["04", None, None, "46", None, None, "09"])
+    return {"emhi": emhi, "yrno": yrno}
+
+
+def test_align_hourly_matches_outer_merge(frames):
+    emhi = frames["emhi"].iloc[:6]
+    expected = pd.merge(emhi, frames["yrno"], how="outer", on=["start", "end"], suffixes=["_emhi", "_yrno"])
+    result = forecast_merge.align({"emhi": emhi, "yrno": frames["yrno"]})
+    for column in expected.columns:
+        values = result[column].astype(object) if column.startswith("symbol") else result[column]
+        expected_values = expected[column].astype(object) if column.startswith("symbol") else expected[column]
+        pd.testing.assert_series_equal(values, expected_values, check_dtype=False, check_names=False)
+
+
+def test_align_keeps_provider_start_times(frames):
+    result = forecast_merge.align(frames).set_index("start")
+    assert len(result) == 12
+    assert result.loc["2018-03-25 06:00", "temperature_emhi"] == -7.0
+    assert result.loc["2018-03-25 06:00", "end"] == pd.Timestamp("2018-03-25 07:00")  # Earliest end
+    # Between its own start times the 6-hour row is not repeated, i.e. the plot joins its points as before
+    assert result.loc["2018-03-25 07:00":, "temperature_emhi"].isnull().all()
+    assert result.loc["2018-03-25 07:00":, "temperature_yrno"].tolist() == [7.0, 8.0, 9.0, 10.0, 11.0]
+
+
+def test_align_fill(frames):
+    result = forecast_merge.align(frames, fill=True).set_index("start")
+    after = result.loc["2018-03-25 06:00":]
+    assert (after["temperature_emhi"] == -7.0).all()  # State values cover the whole interval
+    assert after["precipitation_emhi"].tolist()[0] == 3.0  # Amounts only where the row starts
+    assert after["precipitation_emhi"].iloc[1:].isnull().all()
+    assert after["symbol_emhi"].iloc[1:].isnull().all()
+
+
+def test_align_failed_provider(frames):
+    result = forecast_merge.align({"emhi": City._empty_df(), "yrno": frames["yrno"]})
+    assert len(result) == 12
+    assert result["temperature_emhi"].isnull().all()
+    assert result["symbol_emhi"].isnull().all()
+
+
+def test_resample(frames):
+    result = forecast_merge.resample(forecast_merge.align(frames, fill=True), "6h")
+    assert result["start"].tolist() == [pd.Timestamp("2018-03-25 00:00"), pd.Timestamp("2018-03-25 06:00")]
+    assert result["end"].tolist() == [pd.Timestamp("2018-03-25 06:00"), pd.Timestamp("2018-03-25 12:00")]
+    np.testing.assert_allclose(result["precipitation_emhi"], [0.5, 3.0])
+    np.testing.assert_allclose(result["precipitation_yrno"], [0.6, 0.6])
+    np.testing.assert_allclose(result["temperature_emhi"], [-3.5, -7.0])
+    np.testing.assert_allclose(result["temperature_yrno"], [2.5, 8.5])
+    assert result["symbol_emhi"].tolist() == ["04", "09"]
+    assert forecast_merge.resample(frames["yrno"], "1h") is frames["yrno"]
+
+
+def test_batch_without_cities():
+    result = forecast_batch.get_forecasts([])
+    assert result.empty
+    assert list(result.columns) == ["city"] + list(forecast_merge.align(
+        {"emhi": City._empty_df(), "yrno": City._empty_df()}).columns)
@@ -0,0 +1,125 @@
+"""
+Property-style tests of the vectorized forecast_payload.split_temperatures and jsonize_values against the former
+loop/apply implementations, on randomly generated (seeded) inputs with NaN, runs of zeros and sign flips.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import forecast_payload
+
+CASES = 2000  # Random inputs per test
+MAX_LENGTH = 60
+
+
+def split_temperatures_loop(temperatures):
+    """
+    The former implementation (Python loops), used as the oracle.
+    """
+    plus_temps = []
+    for i, temp in enumerate(temperatures):
+        if temp < 0 and i < len(temperatures) - 1 and temperatures[i + 1] > 0:
+            plus_temps.append(temp)
+        elif temp == 0 and 0 < i < len(temperatures) - 1 \
+                and temperatures[i-1] == 0 and temperatures[i+1] == 0:
+            plus_temps.append(float('NaN'))
+        else:
+            plus_temps.append(temp if temp >= 0 else float('NaN'))
+
+    minus_temps = []
+    for i, temp in enumerate(temperatures):
+        if temp > 0 and i < len(temperatures) - 1 and temperatures[i + 1] < 0:
+            minus_temps.append(temp)
+        else:
+            minus_temps.append(temp if temp <= 0 else float('NaN'))
+
+    return plus_temps, minus_temps
+
+
+def jsonize_values_apply(series) -> list:
+    """
+    The former implementation (Series.apply), used as the oracle.
+    """
+    pd_series = series.copy()
+    if pd_series.name.startswith('symbol'):
+        symbol_path = "symbols/{}.png"
+        jsonized_series = pd_series.apply(lambda x: symbol_path.format(x) if pd.notnull(x) else None)
+    elif pd_series.name == "start":
+        jsonized_series = pd_series.apply(lambda ts: ts.to_pydatetime())
+    else:
+        if pd_series.name.startswith('precipitation'):
+            pd_series = pd_series.replace([0.0], [float('NaN')])
+        jsonized_series = pd_series.apply(lambda x: x if pd.notnull(x) else float('NaN'))
+    return list(jsonized_series)
+
+
+def generate_temperatures(rng: np.random.Generator) -> np.ndarray:
+    """
+    Returns temperatures made of runs of zeros, NaN, and values of either sign (i.e. many sign flips).
+    """
+    length = rng.integers(0, MAX_LENGTH + 1)
+    values = []
+    while len(values) < length:
+        kind = rng.integers(0, 4)
+        run = int(rng.integers(1, 5))
+        if kind == 0:
+            values.extend([0.0] * run)
+        elif kind == 1:
+            values.extend([np.nan] * run)
+        else:
+            values.extend(rng.choice([-1, 1]) * rng.integers(1, 15, size=run) + rng.choice([0, 0.5], size=run))
+    return np.array(values, dtype=float)
+
+
+def assert_equal_nan(result, expected):
+    np.testing.assert_array_equal(np.asarray(result, dtype=float), np.asarray(expected, dtype=float))
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_split_temperatures(seed):
+    rng = np.random.default_rng(seed)
+    for _ in range(CASES // 10):
+        temperatures = generate_temperatures(rng)
+        plus, minus = forecast_payload.split_temperatures(temperatures)
+        expected_plus, expected_minus = split_temperatures_loop(list(temperatures))
+        assert_equal_nan(plus, expected_plus)
+        assert_equal_nan(minus, expected_minus)
+        plus, _ = forecast_payload.split_temperatures(pd.Series(temperatures))  # A Series is accepted as well
+        assert_equal_nan(plus, expected_plus)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_jsonize_values_numeric(seed):
+    rng = np.random.default_rng(seed)
+    for _ in range(CASES // 10):
+        values = generate_temperatures(rng)
+        for name in ("temperature_emhi", "precipitation_yrno"):
+            series = pd.Series(np.abs(values) if name.startswith("precipitation") else values, name=name)
+            result = forecast_payload.jsonize_values(series)
+            assert result.dtype == np.float64
+            assert_equal_nan(result, jsonize_values_apply(series))
+            assert_equal_nan(series.values, values if name.startswith("temperature") else np.abs(values))
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_jsonize_values_symbols(seed):
+    rng = np.random.default_rng(seed)
+    choices = np.array(["01d", "02n", "04", "46", None, None, np.nan], dtype=object)
+    for _ in range(CASES // 10):
+        series = pd.Series(rng.choice(choices, size=rng.integers(0, MAX_LENGTH + 1)), name="symbol_emhi",
+                           dtype=object)
+        # Newer pandas turns the None results of apply into NaN; the former code sent None (i.e. null)
+        expected = [None if pd.isnull(path) else path for path in jsonize_values_apply(series)]
+        assert list(forecast_payload.jsonize_values(series)) == expected
+        assert list(forecast_payload.jsonize_values(series.astype("category"))) == expected
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_jsonize_values_start(seed):
+    rng = np.random.default_rng(seed)
+    for _ in range(CASES // 10):
+        hours = rng.integers(0, 24 * 10, size=rng.integers(1, MAX_LENGTH + 1))
+        starts = pd.Series(pd.Timestamp("2018-03-24") + pd.to_timedelta(np.sort(hours), unit="h"), name="start")
+        starts[rng.random(len(starts)) < 0.1] = pd.NaT
+        expected = [np.nan if pd.isnull(ts) else pd.Timestamp(ts).value / 1e6 for ts in jsonize_values_apply(starts)]
+        assert_equal_nan(forecast_payload.jsonize_values(starts), expected)
@@ -0,0 +1,63 @@
+"""
+Tests of ForecastStore: forecasts round-trip through the SQLite file as Arrow IPC streams.
+"""
+import pickle
+import sqlite3
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from benchmarks import fixtures
+from forecast_data import City
+
+pytest.importorskip("pyarrow")
+import forecast_store  # noqa: E402 (needs pyarrow)
+
+
+@pytest.fixture
+def city() -> City:
+    city = City("Tallinn")
+    yrno = city.parse_yrno(fixtures.synthetic_yrno("Tallinn"))
+    emhi = city.parse_emhi(fixtures.synthetic_emhi("Tallinn"))
+    return City.from_frames("Tallinn", yrno, emhi, datetime(2018, 3, 24, 6, 11), datetime(2018, 3, 24, 18, 43),
+                            1521900000.0, {"yrno": {"etag": '"y1"', "last_modified": None},
+                                           "emhi": {"etag": None, "last_modified": "Sat, 24 Mar 2018 12:00:00 GMT"}})
+
+
+def test_round_trip(city, tmp_path):
+    store = forecast_store.ForecastStore(str(tmp_path / "store.sqlite"))
+    store.save(city, ttl=600)
+    loaded, expires_at = forecast_store.ForecastStore(store.path).load_city("Tallinn")  # Another connection
+    assert expires_at == city.fetched_at + 600
+    pd.testing.assert_frame_equal(loaded.yrno, city.yrno)
+    pd.testing.assert_frame_equal(loaded.emhi, city.emhi)
+    assert (loaded.sunrise, loaded.sunset) == (city.sunrise, city.sunset)
+    assert loaded.validators == city.validators
+    assert loaded.version == city.version
+
+
+def test_frames_are_not_pickled(city, tmp_path):
+    store = forecast_store.ForecastStore(str(tmp_path / "store.sqlite"))
+    store.save(city, ttl=600)
+    with sqlite3.connect(store.path) as connection:
+        frames = [row[0] for row in connection.execute("SELECT frame FROM forecasts")]
+    assert len(frames) == 2
+    with pytest.raises(pickle.UnpicklingError):
+        pickle.loads(frames[0])
+
+
+def test_pickled_rows_are_ignored(city, tmp_path):
+    path = str(tmp_path / "store.sqlite")
+    with sqlite3.connect(path) as connection:  # A store of an earlier version
+        connection.execute("CREATE TABLE forecasts (city TEXT NOT NULL, provider TEXT NOT NULL, fetched_at REAL "
+                           "NOT NULL, expires_at REAL NOT NULL, sunrise TEXT, sunset TEXT, frame BLOB NOT NULL, "
+                           "PRIMARY KEY (city, provider))")
+        for provider in ("yrno", "emhi"):
+            connection.execute("INSERT INTO forecasts VALUES (?, ?, ?, ?, ?, ?, ?)",
+                               ("Tallinn", provider, 0.0, 1.0, None, None, pickle.dumps(getattr(city, provider))))
+    store = forecast_store.ForecastStore(path)
+    assert store.load("Tallinn") == {}
+    assert store.load_city("Tallinn") == (None, None)
+    store.save(city, ttl=600)
+    assert set(store.load("Tallinn")) == {"yrno", "emhi"}
@@ -0,0 +1,31 @@
+"""
+Tests of the streaming yrno parser (City.parse_yrno) with differently formatted XML.
+"""
+import re
+
+import pandas as pd
+import pytest
+
+from benchmarks import fixtures
+from forecast_data import City
+
+
+@pytest.fixture(scope="module")
+def yrno_data() -> bytes:
+    return fixtures.synthetic_yrno("Tallinn")
+
+
+@pytest.mark.parametrize("separator", [b"\n", b"\t", b"\r\n  ", b"  "])
+def test_time_tag_followed_by_whitespace(yrno_data, separator):
+    expected = City("Tallinn").parse_yrno(yrno_data)
+    reformatted = re.sub(rb"<time ", b"<time" + separator, yrno_data)
+    assert reformatted.count(b"<time ") == (len(expected) if separator == b"  " else 0)
+    pd.testing.assert_frame_equal(City("Tallinn").parse_yrno(reformatted), expected)
+
+
+def test_time_in_other_elements_is_ignored(yrno_data):
+    expected = City("Tallinn").parse_yrno(yrno_data)
+    # More <time> elements outside <tabular> than inside only make the preallocated columns larger
+    extra = b"<meta>" + b'<time from="2018-03-25T00:00:00" to="2018-03-26T00:00:00" />' * 3 + b"</meta>"
+    result = City("Tallinn").parse_yrno(yrno_data.replace(b"<forecast>", extra + b"<forecast>"))
+    pd.testing.assert_frame_equal(result, expected)